@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Benchmarks inventory/vmware_folder_inventory.py against a simulated vCenter,
+# comparing the legacy per-property reads with bulk PropertyCollector retrieval
+# (see "Retrieval Modes" in the inventory script). Prints round trips and wall
+# time for each VM count, and checks both modes produce the same inventory.
+#
+#   python benchmarks/inventory_retrieval.py
+#   python benchmarks/inventory_retrieval.py --counts 100 1500 --latency-ms 5
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from simulated_vcenter import Data, SimulatedStub, vim  # noqa: E402
+
+INVENTORY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inventory',
+                                'vmware_folder_inventory.py')
+SUBFOLDERS = 10
+
+
+def load_inventory_module():
+    spec = importlib.util.spec_from_file_location('vmware_folder_inventory', INVENTORY_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_vcenter(vm_count, latency):
+    ''' DC1/vm/UAT1 Demo/App1 holding vm_count VMs spread over a few subfolders '''
+    stub = SimulatedStub(latency=latency, page_limit=1000)
+    stub.config_option = Data(guestOSDescriptor=[Data(id='rhel7_64Guest', family='linuxGuest'),
+                                                 Data(id='windows9Server64Guest', family='windowsGuest')])
+
+    root = stub.add(vim.Folder, 'group-d', name='Datacenters', parent=None)
+    dc = stub.add(vim.Datacenter, 'datacenter', name='DC1', parent=root)
+    vm_folder = stub.add(vim.Folder, 'group-v', name='vm', parent=dc)
+    uat = stub.add(vim.Folder, 'group-v', name='UAT1 Demo', parent=vm_folder)
+    app = stub.add(vim.Folder, 'group-v', name='App1', parent=uat)
+
+    env_browser = stub.add(vim.EnvironmentBrowser, 'envbrowser')
+    compute = stub.add(vim.ClusterComputeResource, 'domain-c', name='Cluster1', environmentBrowser=env_browser)
+    host_folder = stub.add(vim.Folder, 'group-h', name='host', parent=dc, childEntity=[compute])
+    stub.set(root, childEntity=[dc])
+    stub.set(dc, vmFolder=vm_folder, hostFolder=host_folder)
+    stub.set(vm_folder, childEntity=[uat])
+    stub.set(uat, childEntity=[app])
+
+    folders = [app] + [stub.add(vim.Folder, 'group-v', name='sub%02d' % i, parent=app) for i in range(SUBFOLDERS)]
+    children = dict((folder, []) for folder in folders)
+    for i in range(vm_count):
+        folder = folders[i % len(folders)]
+        guest_id = 'rhel7_64Guest' if i % 3 else 'windows9Server64Guest'
+        vm = stub.add(vim.VirtualMachine, 'vm', name='U1host%05d' % i, parent=folder,
+                      config=Data(template=False, name='U1host%05d' % i, guestId=guest_id,
+                                  instanceUuid='5000-%05d' % i),
+                      runtime=Data(powerState='poweredOff'),
+                      guest=Data(toolsStatus='toolsNotRunning', ipAddress=None, hostName=None))
+        children[folder].append(vm)
+    for folder in folders:
+        stub.set(folder, childEntity=(folders[1:] if folder is app else []) + children[folder])
+
+    stub.inventory_paths['DC1/vm/UAT1 Demo/App1'] = app
+    content = Data(rootFolder=root, viewManager=stub.add(vim.view.ViewManager, 'ViewManager'),
+                   searchIndex=stub.add(vim.SearchIndex, 'SearchIndex'),
+                   propertyCollector=stub.add(vim.PropertyCollector, 'propertyCollector'))
+    return stub, content
+
+
+def run(module, stub, content, retrieval):
+    os.environ['vmfolder_retrieval'] = retrieval
+    inventory = module.VMWareInventory(content=content)
+    start_trips = stub.round_trips
+    start = time.time()
+    output = inventory.show()
+    return output, stub.round_trips - start_trips, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 500, 1500])
+    parser.add_argument('--latency-ms', type=float, default=1.0,
+                        help='simulated round trip latency per vCenter call')
+    args = parser.parse_args()
+
+    os.environ.update({'VMWARE_SERVER': 'vcsim', 'VMWARE_PORT': '443', 'VMWARE_USERNAME': 'bench',
+                       'VMWARE_PASSWORD': 'bench', 'VMWARE_VALIDATE_CERTS': 'false',
+                       'vmfolder_groups': '{"DC1": {"/UAT1 Demo/App1": {}}}',
+                       'vmfolder_cache_ttl': '0'})
+    module = load_inventory_module()
+
+    print('%8s  %14s  %10s  %14s  %10s  %8s' % ('vms', 'legacy trips', 'legacy s', 'bulk trips', 'bulk s', 'speedup'))
+    for count in args.counts:
+        stub, content = build_vcenter(count, args.latency_ms / 1000.0)
+        legacy, legacy_trips, legacy_time = run(module, stub, content, 'legacy')
+        bulk, bulk_trips, bulk_time = run(module, stub, content, 'bulk')
+        if legacy != bulk:
+            sys.exit("ERROR: legacy and bulk inventories differ at %d VMs" % count)
+        print('%8d  %14d  %10.3f  %14d  %10.3f  %7.1fx' % (count, legacy_trips, legacy_time, bulk_trips, bulk_time,
+                                                          legacy_time / bulk_time))
+
+
+if __name__ == '__main__':
+    main()
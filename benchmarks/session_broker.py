@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Benchmarks the per task cost of getting a vCenter session, with and without
+# the session cache in module_utils/fl_vmware_session.py. Without it every
+# fl_vmware_* task runs what PyVmomi(module) does: SmartConnect (version
+# negotiation, RetrieveServiceContent, Login), another RetrieveServiceContent
+# and a Logout at exit. With it, all but the first task attach to the cached
+# session with RetrieveServiceContent and a currentSession read.
+#
+# By default runs against the simulated vCenter. Give --host to measure a real
+# vCenter (or vcsim) instead, the password is read from VMWARE_PASSWORD.
+#
+#   python benchmarks/session_broker.py
+#   python benchmarks/session_broker.py --tasks 200 --latency-ms 5 --login-ms 300
+#   VMWARE_PASSWORD=... python benchmarks/session_broker.py --host vcenter.example.com --user bench --no-validate-certs
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from simulated_vcenter import Data, SimulatedStub, vim  # noqa: E402
+import fl_vmware_session  # noqa: E402
+
+
+def simulated(args):
+    ''' returns (login, logout, round trips) run against one simulated vCenter '''
+    stub = SimulatedStub(latency=args.latency_ms / 1000.0)
+    stub.login_latency = args.login_ms / 1000.0
+    stub.service_content = Data(sessionManager=stub.add(vim.SessionManager, 'SessionManager'))
+
+    def login():
+        # every task opens a new connection, which starts without a cookie
+        stub.cookie = ''
+        stub._round_trip()  # SmartConnect's GET of /sdk/vimServiceVersions.xml
+        si = vim.ServiceInstance('ServiceInstance', stub)
+        si.RetrieveContent().sessionManager.Login(args.user, 'bench', None)
+        return si, si.RetrieveContent()
+
+    def logout(si, content):
+        content.sessionManager.Logout()
+
+    def new_stub(**kwargs):
+        stub.cookie = ''
+        return stub
+
+    fl_vmware_session.SoapStubAdapter = new_stub
+    return login, logout, lambda: stub.round_trips
+
+
+def real(args):
+    ''' returns (login, logout, round trips) run against args.host '''
+    from pyVim.connect import SmartConnect, Disconnect
+
+    context = fl_vmware_session.ssl_context(args.validate_certs)
+    kwargs = {'host': args.host, 'port': args.port, 'user': args.user, 'pwd': os.environ['VMWARE_PASSWORD']}
+    if context:
+        kwargs['sslContext'] = context
+
+    def login():
+        si = SmartConnect(**kwargs)
+        return si, si.RetrieveContent()
+
+    def logout(si, content):
+        Disconnect(si)
+
+    return login, logout, lambda: None
+
+
+def run(tasks, task):
+    ''' returns (seconds per task, logins) over tasks runs of task, which returns whether it logged in '''
+    logins = 0
+    start = time.time()
+    for i in range(tasks):
+        logins += task()
+    return (time.time() - start) / tasks, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100, help='module runs to simulate')
+    parser.add_argument('--latency-ms', type=float, default=2.0,
+                        help='simulated round trip latency per vCenter call')
+    parser.add_argument('--login-ms', type=float, default=150.0,
+                        help='simulated time vCenter takes to log a user in (SSO token exchange)')
+    parser.add_argument('--host', help='measure this vCenter instead of the simulated one')
+    parser.add_argument('--port', type=int, default=443)
+    parser.add_argument('--user', default='bench')
+    parser.add_argument('--no-validate-certs', dest='validate_certs', action='store_false')
+    args = parser.parse_args()
+
+    login, logout, round_trips = real(args) if args.host else simulated(args)
+    host = args.host or 'vcsim'
+    password = os.environ['VMWARE_PASSWORD'] if args.host else 'bench'
+    fl_vmware_session.SESSION_DIR = tempfile.mkdtemp()
+
+    def without_broker():
+        si, content = login()
+        logout(si, content)
+        return 1
+
+    def with_broker():
+        si, content, reused = fl_vmware_session.connect(host, args.port, args.user, password, login)
+        return 0 if reused else 1
+
+    try:
+        print('%14s  %10s  %12s  %8s' % ('', 'ms/task', 'trips/task', 'logins'))
+        for name, task in [('without broker', without_broker), ('with broker', with_broker)]:
+            start_trips = round_trips()
+            seconds, logins = run(args.tasks, task)
+            trips = '-' if start_trips is None else '%.1f' % ((round_trips() - start_trips) / float(args.tasks))
+            print('%14s  %10.1f  %12s  %8d' % (name, seconds * 1000, trips, logins))
+    finally:
+        shutil.rmtree(fl_vmware_session.SESSION_DIR)
+
+
+if __name__ == '__main__':
+    main()
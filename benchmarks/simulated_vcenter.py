@@ -0,0 +1,166 @@
+# coding=utf-8
+
+# Simulated vCenter used by the forklift benchmarks.
+#
+# pyVmomi managed objects forward every property read and every method call to
+# their stub (stub.InvokeAccessor / stub.InvokeMethod). SimulatedStub stands in
+# for vCenter: it answers from an in-memory inventory, sleeps for a configurable
+# latency on each call to mimic a SOAP round trip, and counts the round trips so
+# benchmarks can report both wall time and request counts.
+#
+# Only the handful of API calls the benchmarks exercise are implemented. Any
+# other method raises NotImplementedError so a benchmark can't silently measure
+# the wrong thing.
+
+import itertools
+import time
+
+try:
+    from pyVmomi import vim
+except ImportError:
+    raise SystemExit("ERROR: the benchmarks require the 'pyVmomi' Python module")
+
+
+class Data(object):
+    ''' Plain attribute bag standing in for vmodl data objects '''
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class SimulatedStub(object):
+
+    def __init__(self, latency=0.001, page_limit=None):
+        self.latency = latency
+        # server side cap on objects per RetrievePropertiesEx page, regardless
+        # of what the client asks for (vCenter does the same)
+        self.page_limit = page_limit
+        self.round_trips = 0
+        self.objects = {}
+        self.inventory_paths = {}
+        self.config_option = Data(guestOSDescriptor=[])
+        self._ids = itertools.count(1)
+        self._tokens = {}
+        # sessions: the stub's cookie is the client side, sessions the server
+        # side, and login_latency the extra time vCenter takes to log a user in
+        self.version = 'vim.version.version11'
+        self.cookie = ''
+        self.sessions = set()
+        self.login_latency = 0
+        self.service_content = None
+
+    def add(self, vimtype, prefix, **props):
+        ''' creates a managed object bound to this stub '''
+        mo = vimtype('%s-%d' % (prefix, next(self._ids)), self)
+        self.objects[mo._moId] = props
+        return mo
+
+    def get(self, mo, path):
+        ''' resolves a dotted property path server side, without a round trip '''
+        value = self.objects[mo._moId]
+        for part in path.split('.'):
+            if isinstance(value, dict):
+                value = value.get(part)
+            else:
+                value = getattr(value, part, None)
+            if value is None:
+                return None
+        return value
+
+    def set(self, mo, **props):
+        self.objects[mo._moId].update(props)
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # pyVmomi stub interface
+
+    def InvokeAccessor(self, mo, info):
+        self._round_trip()
+        if info.name == 'currentSession':
+            return Data(key=self.cookie) if self.cookie in self.sessions else None
+        return self.objects[mo._moId].get(info.name)
+
+    def InvokeMethod(self, mo, info, args):
+        self._round_trip()
+        handler = getattr(self, '_%s' % info.name, None)
+        if handler is None:
+            raise NotImplementedError("simulated vCenter does not implement %s" % info.name)
+        return handler(mo, *args)
+
+    # simulated API calls
+
+    def _descendants(self, container):
+        for child in self.objects[container._moId].get('childEntity') or []:
+            yield child
+            for obj in self._descendants(child):
+                yield obj
+
+    def _CreateContainerView(self, mo, container, type, recursive):
+        if recursive:
+            objs = list(self._descendants(container))
+        else:
+            objs = list(self.objects[container._moId].get('childEntity') or [])
+        if type:
+            objs = [obj for obj in objs if isinstance(obj, tuple(type))]
+        return self.add(vim.view.ContainerView, 'session[view]', view=objs)
+
+    def _Destroy(self, mo):
+        self.objects.pop(mo._moId, None)
+
+    def _RetrieveContent(self, mo):
+        return self.service_content
+
+    def _Login(self, mo, userName, password, locale):
+        if self.login_latency:
+            time.sleep(self.login_latency)
+        self.cookie = 'vmware_soap_session="%d"' % next(self._ids)
+        self.sessions.add(self.cookie)
+        return Data(key=self.cookie, userName=userName)
+
+    def _Logout(self, mo):
+        self.sessions.discard(self.cookie)
+
+    def _FindByInventoryPath(self, mo, inventoryPath):
+        return self.inventory_paths.get(inventoryPath)
+
+    def _QueryConfigOption(self, mo, key, host):
+        return self.config_option
+
+    def _RetrievePropertiesEx(self, mo, specSet, options):
+        contents = []
+        for filter_spec in specSet:
+            for obj_spec in filter_spec.objectSet:
+                objs = [] if obj_spec.skip else [obj_spec.obj]
+                for select in obj_spec.selectSet or []:
+                    objs.extend(self.get(obj_spec.obj, select.path) or [])
+                for obj in objs:
+                    for prop_spec in filter_spec.propSet:
+                        if not isinstance(obj, prop_spec.type):
+                            continue
+                        prop_set = []
+                        for path in prop_spec.pathSet:
+                            value = self.get(obj, path)
+                            if value is not None:
+                                prop_set.append(Data(name=path, val=value))
+                        contents.append(Data(obj=obj, propSet=prop_set))
+                        break
+
+        page_size = options.maxObjects if options and options.maxObjects else len(contents)
+        if self.page_limit:
+            page_size = min(page_size, self.page_limit)
+        return self._page(contents, page_size)
+
+    def _ContinueRetrievePropertiesEx(self, mo, token):
+        contents, page_size = self._tokens.pop(token)
+        return self._page(contents, page_size)
+
+    def _page(self, contents, page_size):
+        if not contents:
+            return None
+        token = None
+        if len(contents) > page_size:
+            token = 'token-%d' % next(self._ids)
+            self._tokens[token] = (contents[page_size:], page_size)
+        return Data(objects=contents[:page_size], token=token)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Benchmarks the snapshot-get-iter response parser in
+# library/fl_na_ontap_snapshot_facts.py against the xmltodict parser it
+# replaced, which serialized every record, re-parsed it, round tripped it
+# through json and copied the whole result dict once per record. Prints wall
+# time and peak memory for each record count, and checks both parsers produce
+# the same facts.
+#
+# Needs netapp-lib, and an Ansible that ships ansible.module_utils.netapp
+# (2.8/2.9) so the module can be imported. The legacy parser also needs
+# xmltodict, and is skipped above --legacy-max records as it is quadratic.
+#
+#   python benchmarks/snapshot_parser.py
+#   python benchmarks/snapshot_parser.py --counts 2000 20000 100000 --legacy-max 100000
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    from lxml import etree
+    from netapp_lib.api.zapi import zapi
+except ImportError:
+    raise SystemExit("ERROR: the benchmark requires the 'netapp-lib' Python module")
+
+try:
+    import xmltodict
+    HAS_XMLTODICT = True
+except ImportError:
+    HAS_XMLTODICT = False
+
+FACTS_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'library',
+                            'fl_na_ontap_snapshot_facts.py')
+SNAPSHOTS_PER_VOLUME = 10
+
+
+def load_facts_module():
+    spec = importlib.util.spec_from_file_location('fl_na_ontap_snapshot_facts', FACTS_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_response(count):
+    ''' a snapshot-get-iter response holding count snapshot-info records, as netapp-lib parses it '''
+    records = []
+    for i in range(count):
+        records.append('<snapshot-info><name>daily.%06d</name><volume>vol%05d_seed</volume>'
+                       '<vserver>svm1</vserver><access-time>%d</access-time></snapshot-info>' %
+                       (i, i // SNAPSHOTS_PER_VOLUME, 1500000000 + i))
+    xml = ("<results xmlns='http://www.netapp.com/filer/admin' status='passed'>"
+           "<attributes-list>%s</attributes-list><num-records>%d</num-records></results>" %
+           (''.join(records), count))
+    return zapi.NaElement(etree.XML(xml))
+
+
+def legacy_parse(attributes_list, attribute, field):
+    ''' the parser before the rewrite, minus the commented out snapmirror filter '''
+    def convert_keys(d):
+        out = {}
+        if isinstance(d, dict):
+            for k, v in d.items():
+                out[k.replace('-', '_')] = convert_keys(v)
+        else:
+            return d
+        return out
+
+    out = {}
+    for child in attributes_list.get_children():
+        d = xmltodict.parse(child.to_string(), xml_attribs=False)
+        d = d[attribute]
+        # the legacy parser searched the pre-conversion dict by key
+        unique_key = d[field]
+        out = out.copy()
+        out.update({unique_key: convert_keys(json.loads(json.dumps(d)))})
+    return out
+
+
+def measure(parse):
+    # timed and traced separately, as tracemalloc slows allocation heavy code
+    # down several times over
+    start = time.time()
+    out = parse()
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak / (1024.0 * 1024.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[2000, 20000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=20000,
+                        help='largest record count to run the legacy parser at')
+    args = parser.parse_args()
+
+    module = load_facts_module()
+    facts = module.NetAppGatherFacts.__new__(module.NetAppGatherFacts)
+    if not HAS_XMLTODICT:
+        print("xmltodict is not installed, skipping the legacy parser")
+
+    print('%8s  %10s  %10s  %10s  %10s  %8s' % ('records', 'legacy s', 'legacy MB', 'new s', 'new MB', 'speedup'))
+    for count in args.counts:
+        attributes_list = build_response(count).get_child_by_name('attributes-list')
+
+        new, new_time, new_peak = measure(lambda: facts.parse_attributes_list(attributes_list, {},
+                                                                              'snapshot-info', 'volume'))
+
+        if HAS_XMLTODICT and count <= args.legacy_max:
+            legacy, legacy_time, legacy_peak = measure(lambda: legacy_parse(attributes_list, 'snapshot-info',
+                                                                            'volume'))
+            if legacy != new:
+                sys.exit("ERROR: legacy and new parsers differ at %d records" % count)
+            print('%8d  %10.3f  %10.1f  %10.3f  %10.1f  %7.1fx' % (count, legacy_time, legacy_peak, new_time,
+                                                                   new_peak, legacy_time / new_time))
+        else:
+            print('%8d  %10s  %10s  %10.3f  %10.1f  %8s' % (count, '-', '-', new_time, new_peak, '-'))
+
+
+if __name__ == '__main__':
+    main()
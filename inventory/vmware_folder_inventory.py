@@ -100,20 +100,93 @@
 #
 # Note: to print human readable json stored as an environment variable:
 # env |awk -F '=' '/vmfolder_groups/ {print $2}' |jq .
-
+#
+#
+# 5. Retrieval Modes
+#
+# The optional 'vmfolder_retrieval' environment variable selects how VM
+# properties are fetched from vCenter:
+#   - bulk (default): one PropertyCollector RetrievePropertiesEx call per folder
+#     (paged with ContinueRetrievePropertiesEx) that requests only the
+#     properties used as hostvars, plus the name/parent of every subfolder so
+#     guest_folder paths are built without walking vm.parent.
+#   - legacy: reads each property off each VM object, which costs a SOAP round
+#     trip per property per VM. Kept for comparison and troubleshooting.
+#
+#   export vmfolder_retrieval=legacy
+#
+#
+# 6. Caching
+#
+# In bulk mode the inventory is cached on disk, keyed by vCenter server, user
+# and vmfolder_groups, so repeated runs within the TTL don't touch vCenter at
+# all. The cache is built from a PropertyCollector filter that is left in
+# place on the vCenter session, and the cache remembers the session, the
+# collector and its last WaitForUpdatesEx version. Once the TTL expires, or
+# when the script is run with '--refresh', only the VMs and folders that
+# changed since that version are pulled and applied to the cache. If the
+# session has expired (vCenter idle timeout) the cache is rebuilt in full. A
+# rebuild on the same session destroys the previous collector and its views
+# first, so they don't pile up on the session.
+#   - vmfolder_cache_ttl: seconds a cached inventory is served without asking
+#     vCenter for changes (default 300). Set to 0 to disable caching.
+#   - vmfolder_cache_dir: where cache files are kept
+#     (default ~/.ansible/tmp/vmware_folder_inventory). Cache files hold a
+#     vCenter session cookie and are written with mode 0600.
+#
+#   ./vmware_folder_inventory.py --refresh
+#
+#
+# 7. Sessions
+#
+# The vCenter login is shared with the fl_vmware_* modules through
+# module_utils/fl_vmware_session.py: the inventory attaches to the session
+# cached for VMWARE_SERVER, VMWARE_PORT and VMWARE_USERNAME, and only logs in
+# when there is none, it has expired or it was cached with another
+# VMWARE_PASSWORD. Set FL_VMWARE_SESSION_CACHE=false to log in (and out) on
+# every run.
+
+import argparse
 import atexit
+import hashlib
 import ssl
 import os
 import re
 import sys
 import json
+import time
 
 try:
     from pyVmomi import vim, vmodl
-    from pyVim.connect import SmartConnect, Disconnect
+    from pyVim.connect import SmartConnect, SmartStubAdapter, Disconnect
 except ImportError:
     sys.exit("ERROR: This inventory script required 'pyVmomi' Python module, it was not able to load it")
 
+# the vCenter session cache shared with the fl_vmware_* modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+import fl_vmware_session  # noqa: E402
+
+
+# VM properties requested in bulk mode. Only what is needed to build hostvars.
+VM_PROPERTIES = [
+    'name',
+    'parent',
+    'config.template',
+    'config.name',
+    'config.guestId',
+    'config.instanceUuid',
+    'runtime.powerState',
+    'guest.toolsStatus',
+    'guest.ipAddress',
+    'guest.hostName',
+]
+
+# objects returned per RetrievePropertiesEx/ContinueRetrievePropertiesEx page
+RETRIEVE_PAGE_SIZE = 500
+
+# bump whenever the layout of the cache file changes, older caches are discarded
+CACHE_VERSION = 1
+
 
 class VMWareInventory(object):
     __name__ = 'VMWareInventory'
@@ -124,7 +197,7 @@ class VMWareInventory(object):
         # tower invnetory sources, and be called outside the 'all' group namespace.
         return {"all": {"children": ["vmguests"]}, "vmguests": {"children": []}, "_meta": {"hostvars": {}}}
 
-    def __init__(self):
+    def __init__(self, content=None):
         self.inventory = VMWareInventory._empty_inventory()
 
         self.server = os.environ['VMWARE_SERVER']
@@ -139,7 +212,32 @@ class VMWareInventory(object):
         # will raise KeyError(key) if not set
         self.vmfolder_groups = json.loads(os.environ['vmfolder_groups'])
 
-        self.content = self._get_content()
+        self.retrieval = os.environ.get('vmfolder_retrieval', 'bulk')
+        if self.retrieval not in ['bulk', 'legacy']:
+            sys.exit("Error: vmfolder_retrieval must be one of 'bulk' or 'legacy', got '%s'" % self.retrieval)
+
+        self.cache_ttl = int(os.environ.get('vmfolder_cache_ttl', 300))
+        self.cache_dir = os.path.expanduser(
+            os.environ.get('vmfolder_cache_dir', '~/.ansible/tmp/vmware_folder_inventory'))
+        # caching relies on the PropertyCollector, so it's only available in bulk mode
+        self.caching = self.cache_ttl > 0 and self.retrieval == 'bulk'
+
+        self.si = None
+        self._content = content
+
+    @property
+    def content(self):
+        # connect on first use so cache hits never log in to vCenter
+        if self._content is None:
+            self._content = self._get_content()
+        return self._content
+
+    def _ssl_context(self):
+        if hasattr(ssl, 'SSLContext') and not self.validate_certs:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.verify_mode = ssl.CERT_NONE
+            return context
+        return None
 
     def _get_content(self):
         kwargs = {'host': self.server,
@@ -147,13 +245,13 @@ class VMWareInventory(object):
           'pwd': self.password,
           'port': int(self.port)}
 
-        if hasattr(ssl, 'SSLContext') and not self.validate_certs:
-            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
-            context.verify_mode = ssl.CERT_NONE
+        context = self._ssl_context()
+        if context:
             kwargs['sslContext'] = context
 
         try:
-            si = SmartConnect(**kwargs)
+            si, content, reused = fl_vmware_session.connect(self.server, self.port, self.username, self.password,
+                                                            lambda: self._login(kwargs), context=context)
         except ssl.SSLError as connection_error:
             if '[SSL: CERTIFICATE_VERIFY_FAILED]' in str(connection_error) and self.validate_certs:
                 sys.exit("Unable to connect to ESXi server due to %s, "
@@ -165,11 +263,21 @@ class VMWareInventory(object):
         if not si:
             sys.exit("Could not connect to the specified host using specified "
                      "username and password")
-        atexit.register(Disconnect, si)
-        content = si.RetrieveContent()
+        # when caching, the session (and the PropertyCollector filter on it) is
+        # left open for the next run to pick up, as is a session shared with
+        # the fl_vmware_* modules. vCenter expires it once idle.
+        if not self.caching and not fl_vmware_session.SESSION_CACHE:
+            atexit.register(Disconnect, si)
+        self.si = si
 
         return content
 
+    def _login(self, kwargs):
+        si = SmartConnect(**kwargs)
+        if not si:
+            return None, None
+        return si, si.RetrieveContent()
+
     def _get_all_objs(self, vimtype, folder=None, recurse=True):
         if not folder:
             folder = self.content.rootFolder
@@ -180,6 +288,105 @@ class VMWareInventory(object):
             obj.update({managed_object_ref: managed_object_ref.name})
         return obj
 
+    def _folder_view_spec(self, folder):
+        ''' Creates a container view of the VMs and subfolders under folder and
+        returns it along with a FilterSpec selecting their hostvar properties. '''
+        view = self.content.viewManager.CreateContainerView(folder, [vim.VirtualMachine, vim.Folder], True)
+
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseEntities', path='view', skip=False, type=vim.view.ContainerView)
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal_spec])
+        prop_specs = [
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine, pathSet=VM_PROPERTIES),
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.Folder, pathSet=['name', 'parent']),
+        ]
+        return view, vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=prop_specs)
+
+    def _retrieve_properties(self, folder):
+        ''' Fetches VM hostvar properties and subfolder name/parent for every
+        object under folder with a single PropertyCollector traversal. Returns a
+        list of (managed object, {property path: value}) tuples. '''
+        view, filter_spec = self._folder_view_spec(folder)
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=RETRIEVE_PAGE_SIZE)
+
+        collector = self.content.propertyCollector
+        objects = []
+        try:
+            result = collector.RetrievePropertiesEx(specSet=[filter_spec], options=options)
+            while result:
+                for obj_content in result.objects:
+                    objects.append((obj_content.obj, dict((p.name, p.val) for p in obj_content.propSet)))
+                if not result.token:
+                    break
+                result = collector.ContinueRetrievePropertiesEx(token=result.token)
+        finally:
+            view.Destroy()
+
+        return objects
+
+    def _get_folder_vms(self, folder, folder_path):
+        ''' Returns a list of hostvar property dicts for every VM under folder,
+        using one bulk property retrieval. folder_path is the inventory path of
+        folder (e.g. /datacenter1/vm/path/to/folder1), used as the root when
+        building each VM's guest_folder. '''
+        folders = {}
+        vms = []
+        for obj, props in self._retrieve_properties(folder):
+            if isinstance(obj, vim.Folder):
+                folders[obj] = props
+            else:
+                vms.append(props)
+
+        return self._resolve_folder_paths(folder, folder_path, folders, vms)
+
+    def _resolve_folder_paths(self, folder, folder_path, folders, vms):
+        ''' Sets the 'folder' path of each VM property dict in vms. folders maps
+        each subfolder of folder to its name/parent properties. Works with
+        managed objects or cached moIds as keys. '''
+        # resolve folder paths top down from the requested folder, memoizing as
+        # we go so each folder is only resolved once.
+        paths = {folder: folder_path}
+
+        def resolve(obj):
+            if obj not in paths:
+                props = folders.get(obj)
+                if props is None:
+                    return None
+                parent_path = resolve(props['parent'])
+                if parent_path is None:
+                    return None
+                paths[obj] = parent_path + '/' + props['name']
+            return paths[obj]
+
+        for props in vms:
+            props['folder'] = resolve(props.get('parent'))
+
+        return vms
+
+    def _get_folder_vms_legacy(self, folder):
+        ''' Returns a list of hostvar property dicts for every VM under folder,
+        reading each property off each VM object. '''
+        vms = []
+        for vm in self._get_all_objs([vim.VirtualMachine], folder):
+            try:
+                if vm.config.template:
+                    continue
+            except Exception as e:
+                print(vm.name, e)
+
+            vms.append({
+                'config.template': False,
+                'config.name': vm.config.name,
+                'config.guestId': vm.config.guestId,
+                'config.instanceUuid': vm.config.instanceUuid,
+                'runtime.powerState': vm.runtime.powerState,
+                'guest.toolsStatus': vm.guest.toolsStatus,
+                'guest.ipAddress': vm.guest.ipAddress,
+                'guest.hostName': vm.guest.hostName,
+                'folder': self.get_vm_path(vm),
+            })
+        return vms
+
     def _group_to_safe(self, word):
         ''' Converts 'bad' characters in a string to dashes so they can be used
          as Ansible groups '''
@@ -227,70 +434,285 @@ class VMWareInventory(object):
             folder_name = '/' + folder_name
         return folder_name
 
-    def show(self):
-        self._get_os_families()
-
-        # iterate over all datacenters, then folder paths in user provided vmfolder_groups
+    def _find_folders(self):
+        ''' Yields (datacenter, folder path, inventory path, folder) for every
+        folder in the user provided vmfolder_groups '''
         for datacenter in self.vmfolder_groups:
             for folderPath in self.vmfolder_groups[datacenter]:
                 path = '%s/vm/%s' % (datacenter, folderPath.strip('/'))
 
                 folder = self.content.searchIndex.FindByInventoryPath(path)
-
-                try:
-                    unsafeGroup = '%s/%s' % (datacenter, folderPath.strip('/'))
-                    groupName = self._group_to_safe(unsafeGroup).lower()
-                    #groupName = self._group_to_safe(folder.name).lower()
-                except AttributeError:
+                if folder is None:
                     sys.exit("Error: VMware folder does not exist at path '%s'" % folderPath)
 
-                # create inv group if it doesn't exist and add group_vars
-                if groupName not in self.inventory:
-                    self.inventory[groupName] = {"hosts": [], "vars": {}}
-                    self.inventory[groupName]["vars"] = self.vmfolder_groups[datacenter][folderPath]
-                    self.inventory["vmguests"]["children"].append(groupName)
-
-                vms = self._get_all_objs([vim.VirtualMachine], folder)
-                for vm in vms:
-                    try:
-                        if vm.config.template:
-                            continue
-                    except Exception as e:
-                        print(vm.name, e)
-
-                    hostVars = {
-                        "guest_display_name": vm.config.name,
-                        "guest_os_id": vm.config.guestId,
-                        "guest_os_family": self.os_families[vm.config.guestId],
-                        "guest_folder": self.get_vm_path(vm),
-                        "guest_instance_uuid": vm.config.instanceUuid,
-                        "guest_power_state": vm.runtime.powerState,
-                        "guest_tools_status": vm.guest.toolsStatus,
-                        "guest_ip_address": vm.guest.ipAddress,
-                        "guest_hostname": vm.guest.hostName
-                    }
-
-                    # Checks if vm has a UAT name (e.g. U1,U2,etc) and normalizes
-                    # the inventory hostname
-                    if re.search(r'^[Uu][0-9]', hostVars["guest_display_name"]):
-                        name = self._hostname_to_safe(hostVars["guest_display_name"][2:].lower())
-                    else:
-                        name = hostVars["guest_display_name"].lower()
-
-                    # add to inventory groups
-                    self.inventory[groupName]["hosts"].append(name)
-                    self.inventory["_meta"]["hostvars"][name] = hostVars
-
-                    # create os family ansible group if it doesn't already exist
-                    guestFamily = hostVars["guest_os_family"]
-                    if guestFamily not in self.inventory:
-                      self.inventory[guestFamily] = {"hosts": []}
-                      self.inventory["vmguests"]["children"].append(guestFamily)
-                    # add host to os family group
-                    self.inventory[guestFamily]["hosts"].append(name)
-
-        return json.dumps(self.inventory, indent=4, sort_keys=True)
+                yield datacenter, folderPath, path, folder
+
+    def _crawl(self):
+        ''' Reads the VMs of every vmfolder_groups folder from vCenter. Returns a
+        list of (datacenter, folder path, vms) tuples. '''
+        self._get_os_families()
+
+        folder_vms = []
+        for datacenter, folderPath, path, folder in self._find_folders():
+            if self.retrieval == 'legacy':
+                vms = self._get_folder_vms_legacy(folder)
+            else:
+                vms = self._get_folder_vms(folder, '/%s' % path)
+            folder_vms.append((datacenter, folderPath, vms))
+        return folder_vms
+
+    def _cache_file(self):
+        key = json.dumps([self.server, self.port, self.username, self.vmfolder_groups], sort_keys=True)
+        return os.path.join(self.cache_dir, 'vmware_folder_inventory_%s.json' %
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_file()) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if cache.get('cache_version') != CACHE_VERSION:
+            return None
+        return cache
+
+    def _save_cache(self, state, inventory):
+        cache = {'cache_version': CACHE_VERSION, 'updated': time.time(), 'state': state, 'inventory': inventory}
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, 0o700)
+
+        # write to a temp file and rename so concurrent runs never read a partial cache
+        path = self._cache_file()
+        tmp_path = '%s.%d' % (path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.rename(tmp_path, path)
+
+    @staticmethod
+    def _to_cache_value(value):
+        # managed object references are stored by moId, everything else we
+        # collect (strings, enums, bools) is already json serializable
+        if isinstance(value, vim.ManagedEntity):
+            return value._moId
+        return value
+
+    def _apply_object_update(self, objects, update):
+        key = update.obj._moId
+        if update.kind == 'leave':
+            objects.pop(key, None)
+            return
+
+        entry = objects.setdefault(key, {'type': 'folder' if isinstance(update.obj, vim.Folder) else 'vm',
+                                         'props': {}})
+        for change in update.changeSet or []:
+            if change.op in ['remove', 'indirectRemove']:
+                entry['props'].pop(change.name, None)
+            else:
+                entry['props'][change.name] = self._to_cache_value(change.val)
+
+    def _wait_for_updates(self, collector, state):
+        ''' Applies every change the collector has seen since state['version']
+        to the cached objects of each folder, and advances the version. '''
+        groups = dict((group['filter'], group) for group in state['folders'])
+        # maxWaitSeconds=0 returns immediately instead of blocking for new changes
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=RETRIEVE_PAGE_SIZE)
+
+        while True:
+            update_set = collector.WaitForUpdatesEx(state['version'], options)
+            if update_set is None:
+                break
+
+            state['version'] = update_set.version
+            for filter_update in update_set.filterSet or []:
+                objects = groups[filter_update.filter._moId]['objects']
+                for object_update in filter_update.objectSet or []:
+                    self._apply_object_update(objects, object_update)
+
+            if not update_set.truncated:
+                break
+
+    def _collect_state(self):
+        ''' Builds the cache state from scratch. A private PropertyCollector gets
+        one filter per vmfolder_groups folder, and the first WaitForUpdatesEx
+        call returns everything they select along with the version to ask for
+        changes from next time. '''
+        self._get_os_families()
+
+        collector = self.content.propertyCollector.CreatePropertyCollector()
+        state = {'session': collector._stub.cookie,
+                 'collector': collector._moId,
+                 'version': '',
+                 'os_families': self.os_families,
+                 'folders': []}
+
+        for datacenter, folderPath, path, folder in self._find_folders():
+            # the container view is left in place, the filter depends on it
+            view, filter_spec = self._folder_view_spec(folder)
+            property_filter = collector.CreateFilter(filter_spec, partialUpdates=False)
+            state['folders'].append({'datacenter': datacenter,
+                                     'folder_path': folderPath,
+                                     'root': folder._moId,
+                                     'root_path': '/%s' % path,
+                                     'filter': property_filter._moId,
+                                     'view': view._moId,
+                                     'objects': {}})
+
+        self._wait_for_updates(collector, state)
+        return state
+
+    def _refresh_state(self, state):
+        ''' Pulls only what changed since the cached version, using the session
+        and PropertyCollector recorded in the cache. Returns None if they can no
+        longer be used, in which case the cache has to be rebuilt. '''
+        kwargs = {'host': self.server, 'port': int(self.port)}
+        context = self._ssl_context()
+        if context:
+            kwargs['sslContext'] = context
+
+        try:
+            stub = SmartStubAdapter(**kwargs)
+            stub.cookie = state['session']
+            collector = vmodl.query.PropertyCollector(state['collector'], stub)
+            self._wait_for_updates(collector, state)
+        except Exception:
+            # most likely vim.fault.NotAuthenticated because the session expired,
+            # or InvalidCollectorVersion/ManagedObjectNotFound after a vCenter restart
+            return None
+
+        return state
+
+    def _destroy_state(self, state):
+        ''' Destroys the PropertyCollector and container views of a cache state
+        that is about to be rebuilt. They only outlive the session they were
+        made on, so on the same session they'd otherwise pile up. '''
+        stub = self.content.propertyCollector._stub
+        if state.get('session') != stub.cookie:
+            return
+
+        try:
+            vmodl.query.PropertyCollector(state['collector'], stub).DestroyPropertyCollector()
+        except Exception:
+            # already gone, e.g. after a vCenter restart
+            pass
+        for group in state.get('folders', []):
+            if not group.get('view'):
+                continue
+            try:
+                vim.view.ContainerView(group['view'], stub).Destroy()
+            except Exception:
+                pass
+
+    def _folder_vms_from_state(self, state):
+        folder_vms = []
+        for group in state['folders']:
+            folders = {}
+            vms = []
+            for key, entry in group['objects'].items():
+                props = dict(entry['props'])
+                if entry['type'] == 'folder':
+                    folders[key] = props
+                else:
+                    vms.append(props)
+
+            self._resolve_folder_paths(group['root'], group['root_path'], folders, vms)
+            folder_vms.append((group['datacenter'], group['folder_path'], vms))
+        return folder_vms
+
+    def _build_inventory(self, folder_vms):
+        for datacenter, folderPath, vms in folder_vms:
+            unsafeGroup = '%s/%s' % (datacenter, folderPath.strip('/'))
+            groupName = self._group_to_safe(unsafeGroup).lower()
+
+            # create inv group if it doesn't exist and add group_vars
+            if groupName not in self.inventory:
+                self.inventory[groupName] = {"hosts": [], "vars": {}}
+                self.inventory[groupName]["vars"] = self.vmfolder_groups[datacenter][folderPath]
+                self.inventory["vmguests"]["children"].append(groupName)
+
+            for vm in vms:
+                # VMs without a config (e.g. inaccessible or mid-registration)
+                # don't return config.* properties at all
+                if 'config.name' not in vm:
+                    sys.stderr.write("Skipping VM '%s' with no config\n" % vm.get('name'))
+                    continue
+                if vm['config.template']:
+                    continue
+
+                hostVars = {
+                    "guest_display_name": vm['config.name'],
+                    "guest_os_id": vm['config.guestId'],
+                    "guest_os_family": self.os_families[vm['config.guestId']],
+                    "guest_folder": vm['folder'],
+                    "guest_instance_uuid": vm['config.instanceUuid'],
+                    "guest_power_state": vm['runtime.powerState'],
+                    "guest_tools_status": vm.get('guest.toolsStatus'),
+                    "guest_ip_address": vm.get('guest.ipAddress'),
+                    "guest_hostname": vm.get('guest.hostName')
+                }
+
+                # Checks if vm has a UAT name (e.g. U1,U2,etc) and normalizes
+                # the inventory hostname
+                if re.search(r'^[Uu][0-9]', hostVars["guest_display_name"]):
+                    name = self._hostname_to_safe(hostVars["guest_display_name"][2:].lower())
+                else:
+                    name = hostVars["guest_display_name"].lower()
+
+                # add to inventory groups
+                self.inventory[groupName]["hosts"].append(name)
+                self.inventory["_meta"]["hostvars"][name] = hostVars
+
+                # create os family ansible group if it doesn't already exist
+                guestFamily = hostVars["guest_os_family"]
+                if guestFamily not in self.inventory:
+                  self.inventory[guestFamily] = {"hosts": []}
+                  self.inventory["vmguests"]["children"].append(guestFamily)
+                # add host to os family group
+                self.inventory[guestFamily]["hosts"].append(name)
+
+        return self.inventory
+
+    def show(self, refresh=False):
+        if not self.caching:
+            return json.dumps(self._build_inventory(self._crawl()), indent=4, sort_keys=True)
+
+        # warm cache within its TTL, served without contacting vCenter
+        cache = self._load_cache()
+        if cache and not refresh and time.time() - cache['updated'] < self.cache_ttl:
+            return json.dumps(cache['inventory'], indent=4, sort_keys=True)
+
+        state = None
+        if cache:
+            state = self._refresh_state(cache['state'])
+        if state is None:
+            if cache:
+                self._destroy_state(cache['state'])
+            state = self._collect_state()
+
+        self.os_families = state['os_families']
+        inventory = self._build_inventory(self._folder_vms_from_state(state))
+        self._save_cache(state, inventory)
+
+        return json.dumps(inventory, indent=4, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VMware folder based dynamic inventory')
+    parser.add_argument('--list', action='store_true', help='list the inventory (default)')
+    parser.add_argument('--host', help='hostvars are returned in _meta, so this always returns {}')
+    parser.add_argument('--refresh', action='store_true',
+                        help='pull changes from vCenter even if the cached inventory is within its TTL')
+    args = parser.parse_args()
+
+    if args.host:
+        print(json.dumps({}))
+        return
+
+    print(VMWareInventory().show(refresh=args.refresh))
+
 
 if __name__ == "__main__":
     # Run the script
-    print(VMWareInventory().show())
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/python
+
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+module: fl_na_ontap_job_wait
+short_description: Wait for NetApp ONTAP jobs to finish.
+extends_documentation_fragment:
+    - netapp.na_ontap
+description:
+- Waits for ONTAP jobs, such as the ones started by fl_na_ontap_volume_clone with wait=false.
+- Every job is polled with one job-get-iter query per interval, filtered on the job ids.
+options:
+  jobs:
+    description:
+    - The jobs to wait for. Either a list of job ids, or a dict of name -> job id,
+      such as the C(jobs) returned by fl_na_ontap_volume_clone.
+    required: true
+  vserver:
+    description:
+    - Vserver the jobs run in. Cluster jobs are polled when omitted.
+  timeout:
+    description:
+    - Seconds to wait for all jobs to finish.
+    default: 1800
+  poll_interval:
+    description:
+    - Seconds between polls.
+    default: 2
+  not_found_polls:
+    description:
+    - Number of polls a job must be missing from job-get-iter, without ever
+      having been seen, before it fails as not found. Catches purged jobs,
+      a wrong vserver or a mistyped id without waiting out C(timeout).
+    default: 2
+'''
+
+EXAMPLES = """
+    - name: wait for volume clones started with wait=false
+      fl_na_ontap_job_wait:
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        jobs: "{{ clone_jobs.jobs }}"
+"""
+
+RETURN = """
+jobs:
+    description: Final state of each job, keyed like the jobs option.
+    returned: always
+    type: dict
+    sample: {
+        "uat1_app1": {
+            "job_id": "1234",
+            "state": "success",
+            "seconds": 12.4
+        },
+        "uat1_app2": {
+            "job_id": "1235",
+            "state": "failure",
+            "seconds": 3.1,
+            "msg": "Failed to create volume clone"
+        }
+    }
+"""
+
+import time
+import traceback
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+import ansible.module_utils.netapp as netapp_utils
+
+HAS_NETAPP_LIB = netapp_utils.has_netapp_lib()
+
+# job-state values a job doesn't leave
+FINISHED_STATES = ['success', 'failure', 'error', 'quit', 'dead']
+
+
+class NetAppOntapJobWait(object):
+    """
+        Waits for ONTAP jobs
+    """
+
+    def __init__(self):
+        """
+            Initialize the NetAppOntapJobWait class
+        """
+        self.argument_spec = netapp_utils.na_ontap_host_argument_spec()
+        self.argument_spec.update(dict(
+            jobs=dict(required=True, type='raw'),
+            vserver=dict(required=False, type='str', default=None),
+            timeout=dict(required=False, type='int', default=1800),
+            poll_interval=dict(required=False, type='int', default=2),
+            not_found_polls=dict(required=False, type='int', default=2),
+        ))
+
+        self.module = AnsibleModule(
+            argument_spec=self.argument_spec,
+            supports_check_mode=True
+        )
+
+        parameters = self.module.params
+
+        # jobs are tracked by name, a plain list of ids is named by id
+        self.jobs = parameters['jobs']
+        if isinstance(self.jobs, list):
+            self.jobs = dict((str(job_id), job_id) for job_id in self.jobs)
+        elif not isinstance(self.jobs, dict):
+            self.module.fail_json(msg="jobs must be a list of job ids or a dict of name -> job id")
+        self.jobs = dict((name, str(job_id)) for name, job_id in self.jobs.items())
+
+        self.vserver = parameters['vserver']
+        self.timeout = parameters['timeout']
+        self.poll_interval = parameters['poll_interval']
+        self.not_found_polls = parameters['not_found_polls']
+
+        if HAS_NETAPP_LIB is False:
+            self.module.fail_json(msg="the python NetApp-Lib module is required")
+        else:
+            self.server = netapp_utils.setup_na_ontap_zapi(module=self.module, vserver=self.vserver)
+        return
+
+    def get_job_states(self, job_ids):
+        """
+        Reads the state of every job in job_ids with one job-get-iter query,
+        following next-tag. Returns a dict of job id -> (state, completion message)
+        """
+        states = dict()
+        tag = None
+        while True:
+            job_iter = netapp_utils.zapi.NaElement('job-get-iter')
+            job_iter.add_new_child('max-records', '1000')
+            if tag:
+                job_iter.add_new_child('tag', tag)
+
+            job_info = netapp_utils.zapi.NaElement('job-info')
+            job_info.add_new_child('job-id', '|'.join(job_ids))
+            query = netapp_utils.zapi.NaElement('query')
+            query.add_child_elem(job_info)
+            job_iter.add_child_elem(query)
+
+            desired_info = netapp_utils.zapi.NaElement('job-info')
+            for attribute in ['job-id', 'job-state', 'job-completion']:
+                desired_info.add_child_elem(netapp_utils.zapi.NaElement(attribute))
+            desired_attributes = netapp_utils.zapi.NaElement('desired-attributes')
+            desired_attributes.add_child_elem(desired_info)
+            job_iter.add_child_elem(desired_attributes)
+
+            try:
+                results = self.server.invoke_successfully(job_iter, enable_tunneling=self.vserver is not None)
+            except netapp_utils.zapi.NaApiError as error:
+                self.module.fail_json(msg="Error fetching jobs: %s" % to_native(error),
+                                      exception=traceback.format_exc())
+
+            attributes_list = results.get_child_by_name('attributes-list')
+            if attributes_list is not None:
+                for info in attributes_list.get_children():
+                    states[info.get_child_content('job-id')] = (info.get_child_content('job-state'),
+                                                                info.get_child_content('job-completion'))
+
+            tag = results.get_child_content('next-tag')
+            if not tag:
+                break
+
+        return states
+
+    def apply(self):
+        """
+        Polls until every job is finished or the timeout passes
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        results = dict()
+        pending = dict((job_id, name) for name, job_id in self.jobs.items())
+        # jobs job-get-iter has returned at least once, and polls the others have been missing for
+        seen = set()
+        missing = dict()
+
+        while pending:
+            states = self.get_job_states(list(pending))
+            for job_id, (state, completion) in states.items():
+                seen.add(job_id)
+                if job_id not in pending or state not in FINISHED_STATES:
+                    continue
+                name = pending.pop(job_id)
+                results[name] = dict(job_id=job_id, state=state, seconds=round(time.time() - start, 2))
+                if state != 'success':
+                    results[name]['msg'] = completion or "Job %s ended in state %s" % (job_id, state)
+
+            # a job that has never shown up is purged, in another vserver or
+            # mistyped, it won't finish however long we wait
+            for job_id in [job_id for job_id in pending if job_id not in seen]:
+                missing[job_id] = missing.get(job_id, 0) + 1
+                if missing[job_id] >= self.not_found_polls:
+                    name = pending.pop(job_id)
+                    results[name] = dict(job_id=job_id, state='unknown', seconds=round(time.time() - start, 2),
+                                         msg="Job %s not found" % job_id)
+
+            if not pending or time.time() + self.poll_interval > deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        # jobs not finished in time, or purged from the job table after we
+        # saw them running
+        for job_id, name in pending.items():
+            results[name] = dict(job_id=job_id, state='unknown', seconds=round(time.time() - start, 2),
+                                 msg="Job %s did not finish within %d seconds" % (job_id, self.timeout))
+
+        failed = sorted(name for name in results if 'msg' in results[name])
+        if failed:
+            self.module.fail_json(msg="%d of %d jobs did not succeed: %s" % (len(failed), len(results), ', '.join(failed)),
+                                  jobs=results)
+        self.module.exit_json(changed=False, jobs=results)
+
+
+def main():
+    """
+    Creates the NetApp Ontap Job Wait object and waits on the jobs
+    """
+    obj = NetAppOntapJobWait()
+    obj.apply()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+module: fl_na_ontap_lun_map_batch
+short_description: Map or unmap many NetApp ONTAP LUNs to an igroup in one call.
+extends_documentation_fragment:
+    - netapp.na_ontap
+description:
+- Maps or unmaps every LUN in C(paths) to C(initiator_group_name), in one module run.
+- The lun-map and lun-unmap calls run on C(max_concurrent) worker threads, each of which keeps its own
+  ZAPI connection open for all of its calls.
+- Existing mappings and LUN serial numbers are read with one lun-map-get-iter and one lun-get-iter
+  query, and only the missing or extra mappings are changed.
+- Returns the serial number and NAA ID of every LUN, keyed by path, for importing the datastores.
+options:
+  state:
+    description:
+    - Whether the LUNs should be mapped to the igroup.
+    choices: ['present', 'absent']
+    default: 'present'
+  paths:
+    description:
+    - Paths of the LUNs, e.g. /vol/uat1_app1/lun1.
+    required: true
+  initiator_group_name:
+    description:
+    - Initiator group to map the LUNs to.
+    required: true
+  vserver:
+    description:
+    - Vserver the LUNs are in.
+    required: true
+  max_concurrent:
+    description:
+    - Number of lun-map or lun-unmap calls in flight at a time.
+    default: 4
+'''
+
+EXAMPLES = """
+    - name: map every LUN of a UAT
+      fl_na_ontap_lun_map_batch:
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        initiator_group_name: uat_igroup
+        paths:
+          - /vol/uat1_app1/lun1
+          - /vol/uat1_app2/lun1
+      register: lun_map
+
+    - name: use a LUN's NAA ID
+      debug:
+        msg: "naa.{{ lun_map.luns['/vol/uat1_app1/lun1'].lun_naa_id }}"
+"""
+
+RETURN = """
+luns:
+    description: Per LUN result, keyed by path.
+    returned: always
+    type: dict
+    sample: {
+        "/vol/uat1_app1/lun1": {
+            "changed": true,
+            "mapped": true,
+            "lun_serial_number": "80D7F$Ma2WT-",
+            "lun_naa_id": "600a09803830443746244d613257542d",
+            "seconds": 0.41
+        },
+        "/vol/uat1_app2/lun1": {
+            "changed": false,
+            "mapped": true,
+            "lun_serial_number": "80D7F$Ma2WT/",
+            "lun_naa_id": "600a09803830443746244d613257542f"
+        }
+    }
+"""
+
+from multiprocessing.pool import ThreadPool
+import time
+import traceback
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+import ansible.module_utils.netapp as netapp_utils
+from ansible.module_utils.fl_netapp import ServerPool
+
+HAS_NETAPP_LIB = netapp_utils.has_netapp_lib()
+
+# NetApp's NAA IEEE registered extended identifier, the LUN serial number follows it in hex
+NAA_PREFIX = '600a0980'
+
+
+class NetAppOntapLunMapBatch(object):
+    """
+        Maps or unmaps LUNs to an igroup
+    """
+
+    def __init__(self):
+        """
+            Initialize the NetAppOntapLunMapBatch class
+        """
+        self.argument_spec = netapp_utils.na_ontap_host_argument_spec()
+        self.argument_spec.update(dict(
+            state=dict(required=False, choices=['present', 'absent'], default='present'),
+            paths=dict(required=True, type='list', elements='str'),
+            initiator_group_name=dict(required=True, type='str'),
+            vserver=dict(required=True, type='str'),
+            max_concurrent=dict(required=False, type='int', default=4),
+        ))
+
+        self.module = AnsibleModule(
+            argument_spec=self.argument_spec,
+            supports_check_mode=True
+        )
+
+        parameters = self.module.params
+        self.state = parameters['state']
+        self.paths = parameters['paths']
+        self.initiator_group_name = parameters['initiator_group_name']
+        self.vserver = parameters['vserver']
+        self.max_concurrent = parameters['max_concurrent']
+
+        if HAS_NETAPP_LIB is False:
+            self.module.fail_json(msg="the python NetApp-Lib module is required")
+        else:
+            # every thread, the batch workers included, gets its own kept-alive
+            # connection from the pool
+            self.servers = ServerPool(self.module, self.vserver)
+            self.server = self.servers.get()
+        return
+
+    def get_iter(self, api, info_name, query_fields, attributes, what):
+        """
+        Runs the api get-iter query for info_name records matching query_fields,
+        following next-tag. Returns a list of {attribute: value} dicts
+        """
+        records = []
+        tag = None
+        while True:
+            get_iter = netapp_utils.zapi.NaElement(api)
+            get_iter.add_new_child('max-records', '1000')
+            if tag:
+                get_iter.add_new_child('tag', tag)
+
+            query_info = netapp_utils.zapi.NaElement(info_name)
+            for field, value in query_fields.items():
+                query_info.add_new_child(field, value)
+            query = netapp_utils.zapi.NaElement('query')
+            query.add_child_elem(query_info)
+            get_iter.add_child_elem(query)
+
+            desired_info = netapp_utils.zapi.NaElement(info_name)
+            for attribute in attributes:
+                desired_info.add_child_elem(netapp_utils.zapi.NaElement(attribute))
+            desired_attributes = netapp_utils.zapi.NaElement('desired-attributes')
+            desired_attributes.add_child_elem(desired_info)
+            get_iter.add_child_elem(desired_attributes)
+
+            try:
+                results = self.server.invoke_successfully(get_iter, True)
+            except netapp_utils.zapi.NaApiError as error:
+                self.module.fail_json(msg="Error fetching %s: %s" % (what, to_native(error)),
+                                      exception=traceback.format_exc())
+
+            attributes_list = results.get_child_by_name('attributes-list')
+            if attributes_list is not None:
+                for info in attributes_list.get_children():
+                    records.append(dict((attribute, info.get_child_content(attribute)) for attribute in attributes))
+
+            tag = results.get_child_content('next-tag')
+            if not tag:
+                break
+
+        return records
+
+    def get_serial_numbers(self):
+        """
+        Returns a dict of path -> serial number for every LUN in paths that exists
+        """
+        luns = self.get_iter('lun-get-iter', 'lun-info', {'path': '|'.join(self.paths)},
+                             ['path', 'serial-number'], 'LUNs')
+        return dict((lun['path'], lun['serial-number']) for lun in luns)
+
+    def get_mapped_paths(self):
+        """
+        Returns the set of paths mapped to initiator_group_name
+        """
+        maps = self.get_iter('lun-map-get-iter', 'lun-map-info', {'path': '|'.join(self.paths),
+                                                                  'initiator-group': self.initiator_group_name},
+                             ['path', 'initiator-group'], 'LUN maps')
+        return set(lun_map['path'] for lun_map in maps)
+
+    def change_map_safe(self, path):
+        """
+        Runs in a worker thread. Maps or unmaps path and returns its result
+        instead of failing the module, so one bad LUN doesn't stop the rest
+        """
+        start = time.time()
+        api = 'lun-map' if self.state == 'present' else 'lun-unmap'
+        lun_map = netapp_utils.zapi.NaElement.create_node_with_children(
+            api, **{'path': path, 'initiator-group': self.initiator_group_name})
+        result = dict(changed=True, mapped=self.state == 'present')
+        try:
+            self.servers.get().invoke_successfully(lun_map, True)
+        except netapp_utils.zapi.NaApiError as error:
+            result = dict(changed=False, mapped=self.state != 'present',
+                          msg="Error running %s on %s: %s" % (api, path, to_native(error)))
+        except Exception as error:
+            result = dict(changed=False, mapped=self.state != 'present',
+                          msg="Error running %s on %s: %s" % (api, path, to_native(error)),
+                          exception=traceback.format_exc())
+        result['seconds'] = round(time.time() - start, 2)
+        return result
+
+    @staticmethod
+    def naa_id(serial_number):
+        return NAA_PREFIX + ''.join('%02x' % ord(char) for char in serial_number)
+
+    def apply(self):
+        """
+        Maps or unmaps every LUN that isn't in the requested state yet
+        """
+        netapp_utils.ems_log_event("fl_na_ontap_lun_map_batch", self.server)
+        serial_numbers = self.get_serial_numbers()
+        mapped = self.get_mapped_paths()
+
+        results = dict()
+        pending = []
+        for path in self.paths:
+            if path not in serial_numbers:
+                # nothing to unmap from a LUN that's already gone
+                if self.state == 'present':
+                    results[path] = dict(changed=False, mapped=False, msg="Error LUN %s does not exist" % path)
+                else:
+                    results[path] = dict(changed=False, mapped=False)
+                continue
+            results[path] = dict(changed=False, mapped=path in mapped)
+            if (path in mapped) != (self.state == 'present'):
+                pending.append(path)
+
+        if pending and self.module.check_mode:
+            for path in pending:
+                results[path] = dict(changed=True, mapped=self.state == 'present')
+        elif pending:
+            # each worker reuses one connection for all of its calls
+            pool = ThreadPool(max(min(self.max_concurrent, len(pending)), 1))
+            try:
+                changes = pool.map(self.change_map_safe, pending)
+            finally:
+                pool.close()
+                pool.join()
+                self.servers.close()
+            for path, result in zip(pending, changes):
+                results[path] = result
+
+        for path, serial_number in serial_numbers.items():
+            if path in results:
+                results[path]['lun_serial_number'] = serial_number
+                results[path]['lun_naa_id'] = self.naa_id(serial_number)
+
+        changed = any(result['changed'] for result in results.values())
+        failed = sorted(path for path in results if 'msg' in results[path])
+        if failed:
+            self.module.fail_json(msg="Failed to %s %d of %d LUNs: %s" %
+                                      ('map' if self.state == 'present' else 'unmap', len(failed), len(results),
+                                       ', '.join(failed)),
+                                  changed=changed, luns=results)
+        self.module.exit_json(changed=changed, luns=results)
+
+
+def main():
+    """
+    Creates the NetApp Ontap LUN Map Batch object and runs the correct play task
+    """
+    obj = NetAppOntapLunMapBatch()
+    obj.apply()
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,40 @@ options:
         default: "info"
         required: false
         choices: ['info']
+    volumes:
+        description:
+            - Only return snapshots of these volumes. Names may use ZAPI query
+              wildcards, e.g. C(*_seed). The filter is applied on the controller.
+        required: false
+    desired_attributes:
+        description:
+            - snapshot-info fields to return. Only these are sent by the controller.
+              C(volume) is always included as results are keyed by volume.
+              Set to an empty list to return every field.
+        default: ['name', 'volume', 'vserver', 'access-time']
+        required: false
+    max_records:
+        description:
+            - Number of records requested per snapshot-get-iter call. Results are
+              paged with next-tag until every matching snapshot is read.
+        default: 2048
+        required: false
+    latest:
+        description:
+            - Only return the newest snapshot of each volume, by C(access-time).
+              Rows are reduced as each page is read, so only one snapshot per
+              volume is ever held.
+        type: bool
+        default: false
+        required: false
+    exclude_snapmirror:
+        description:
+            - Skip snapshots owned by SnapMirror, i.e. named C(snapmirror.*) or
+              with a snapmirror C(dependency). Mostly useful with C(latest), to
+              get the newest snapshot that is safe to clone from.
+        type: bool
+        default: false
+        required: false
 '''
 
 EXAMPLES = '''
@@ -38,6 +72,26 @@ EXAMPLES = '''
     username: "admin"
     password: "admins_password"
 
+- name: Get snapshots of seed volumes only
+  fl_na_ontap_snapshot_facts:
+    state: info
+    hostname: "na-vsim"
+    username: "admin"
+    password: "admins_password"
+    volumes:
+      - '*_seed'
+
+- name: Get the newest non-snapmirrored snapshot of each seed volume
+  fl_na_ontap_snapshot_facts:
+    state: info
+    hostname: "na-vsim"
+    username: "admin"
+    password: "admins_password"
+    volumes:
+      - '*_seed'
+    latest: true
+    exclude_snapmirror: true
+
 - debug:
     var: ontap_facts
 '''
@@ -70,18 +124,6 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 import ansible.module_utils.netapp as netapp_utils
 
-try:
-    import xmltodict
-    HAS_XMLTODICT = True
-except ImportError:
-    HAS_XMLTODICT = False
-
-try:
-    import json
-    HAS_JSON = True
-except ImportError:
-    HAS_JSON = False
-
 HAS_NETAPP_LIB = netapp_utils.has_netapp_lib()
 
 
@@ -102,8 +144,11 @@ class NetAppGatherFacts(object):
 
         if query:
             for k, v in query.items():
-                # Can v be nested?
-                api_call.add_new_child(k, v)
+                # nested values are passed in as NaElements
+                if isinstance(v, netapp_utils.zapi.NaElement):
+                    api_call.add_child_elem(v)
+                else:
+                    api_call.add_new_child(k, v)
         try:
             result = self.server.invoke_successfully(api_call, enable_tunneling=False)
             return result
@@ -111,56 +156,128 @@ class NetAppGatherFacts(object):
             self.module.fail_json(msg="Error calling API %s: %s" %
                                   (call, to_native(e)), exception=traceback.format_exc())
 
-    def get_generic_get_iter(self, call, attribute=None, field=None, query=None, children='attributes-list'):
-        generic_call = self.call_api(call, query)
-
+    def get_generic_get_iter(self, call, attribute=None, field=None, query=None, children='attributes-list',
+                             keep=None):
         if field is None:
             out = []
         else:
             out = {}
 
-        attributes_list = generic_call.get_child_by_name(children)
-
-        if attributes_list is None:
+        # follow next-tag until the controller has returned every record
+        found = False
+        tag = None
+        while True:
+            page_query = dict(query or {})
+            if tag:
+                page_query['tag'] = tag
+            generic_call = self.call_api(call, page_query)
+
+            attributes_list = generic_call.get_child_by_name(children)
+            if attributes_list is not None:
+                found = True
+                out = self.parse_attributes_list(attributes_list, out, attribute, field, keep)
+
+            tag = generic_call.get_child_content('next-tag')
+            if not tag:
+                break
+
+        if not found:
             return None
 
-        for child in attributes_list.get_children():
-            d = xmltodict.parse(child.to_string(), xml_attribs=False)
+        return out
 
+    def parse_attributes_list(self, attributes_list, out, attribute=None, field=None, keep=None):
+        # each record is converted straight from the parsed response in one
+        # pass, and added to out in place. The records are walked on the lxml
+        # element NaElement wraps, get_children() would build a wrapper for
+        # every record (and every field of it) up front.
+        #
+        # keep(record, current) can filter or reduce records as they are read:
+        # current is the record already stored under the same key (None if
+        # there's none, or when out is a list) and the new record is only
+        # stored if keep returns True.
+        if isinstance(field, tuple):
+            field = tuple(el.replace('-', '_') for el in field)
+        elif field is not None:
+            field = field.replace('-', '_')
+
+        for child in attributes_list._element.iterchildren():
+            name = _local_name(child)
+            if name is None:
+                continue
             if attribute is not None:
-                d = d[attribute]
-
-            item = json.loads(json.dumps(d))
-           # if 'snapmirror' not in item['name'] and item['volume'] not in item['name']:
-           #     if isinstance(field, str):
-           #         unique_key = _finditem(d, field)
-           #         out = out.copy()
-           #         out.update({unique_key: convert_keys(json.loads(json.dumps(d)))})
-           #     elif isinstance(field, tuple):
-           #         unique_key = ':'.join([_finditem(d, el) for el in field])
-           #         out = out.copy()
-           #         out.update({unique_key: convert_keys(json.loads(json.dumps(d)))})
-           #     else:
-           #         out.append(convert_keys(json.loads(json.dumps(d))))
+                if name != attribute:
+                    continue
+                d = element_to_dict(child)
+            else:
+                d = {name.replace('-', '_'): element_to_dict(child)}
+
             if isinstance(field, str):
-                unique_key = _finditem(d, field)
-                out = out.copy()
-                out.update({unique_key: convert_keys(json.loads(json.dumps(d)))})
+                key = _finditem(d, field)
             elif isinstance(field, tuple):
-                unique_key = ':'.join([_finditem(d, el) for el in field])
-                out = out.copy()
-                out.update({unique_key: convert_keys(json.loads(json.dumps(d)))})
+                key = ':'.join([_finditem(d, el) for el in field])
             else:
-                out.append(convert_keys(json.loads(json.dumps(d))))
+                if keep is None or keep(d, None):
+                    out.append(d)
+                continue
+
+            if keep is None or keep(d, out.get(key)):
+                out[key] = d
 
         return out
 
+    def snapshot_query(self):
+        query = {'max-records': str(self.module.params['max_records'])}
+
+        # only ask for snapshots of the volumes we care about. snapmirror.*
+        # names are dropped by the controller too, dependencies can only be
+        # checked as rows are read.
+        snapshot_info = netapp_utils.zapi.NaElement('snapshot-info')
+        volumes = self.module.params['volumes']
+        if volumes:
+            snapshot_info.add_new_child('volume', '|'.join(volumes))
+        if self.module.params['exclude_snapmirror']:
+            snapshot_info.add_new_child('name', '!snapmirror.*')
+        if snapshot_info.get_children():
+            query['query'] = netapp_utils.zapi.NaElement('query')
+            query['query'].add_child_elem(snapshot_info)
+
+        # and only the fields we need from each of them, plus the ones
+        # keep_snapshot() looks at
+        attributes = self.module.params['desired_attributes']
+        if attributes:
+            attributes = attributes + ['volume']
+            if self.module.params['latest']:
+                attributes.append('access-time')
+            if self.module.params['exclude_snapmirror']:
+                attributes.extend(['name', 'dependency'])
+            snapshot_info = netapp_utils.zapi.NaElement('snapshot-info')
+            for attribute in set(attributes):
+                snapshot_info.add_child_elem(netapp_utils.zapi.NaElement(attribute))
+            query['desired-attributes'] = netapp_utils.zapi.NaElement('desired-attributes')
+            query['desired-attributes'].add_child_elem(snapshot_info)
+
+        return query
+
+    def keep_snapshot(self, snapshot, current):
+        if self.module.params['exclude_snapmirror']:
+            if (snapshot.get('name') or '').startswith('snapmirror.'):
+                return False
+            if 'snapmirror' in (snapshot.get('dependency') or ''):
+                return False
+
+        # without latest, the last row read for a volume wins, as before
+        if current is None or not self.module.params['latest']:
+            return True
+        return int(snapshot.get('access_time') or 0) > int(current.get('access_time') or 0)
+
     def get_all(self):
         self.netapp_info['ontap_snapshot_facts'] = self.get_generic_get_iter(
             'snapshot-get-iter',
             attribute='snapshot-info',
-						field='volume',
-            query={'max-records': '2048'}
+            field='volume',
+            query=self.snapshot_query(),
+            keep=self.keep_snapshot
         )
 
         return self.netapp_info
@@ -179,14 +296,42 @@ def _finditem(obj, key):
     return None
 
 
-def convert_keys(d):
+def _local_name(element):
+    # ZAPI responses carry a default xml namespace, which lxml prefixes on
+    # every tag as {http://www.netapp.com/filer/admin}name. Comments and
+    # processing instructions have no name.
+    name = element.tag
+    if not isinstance(name, str):
+        return None
+    if name.startswith('{'):
+        return name.split('}', 1)[1]
+    return name
+
+
+def element_to_dict(element):
+    '''
+    Converts an lxml element from a ZAPI response into nested dicts, with
+    '-' in element names replaced by '_'. Leaf elements become their text
+    content (None if empty) and repeated child elements become a list, the
+    same shape xmltodict produced before, without serializing and re-parsing
+    each record.
+    '''
+    if not len(element):
+        return element.text
+
     out = {}
-    if isinstance(d, dict):
-        for k, v in d.items():
-            v = convert_keys(v)
-            out[k.replace('-', '_')] = v
-    else:
-        return d
+    for child in element.iterchildren():
+        key = _local_name(child)
+        if key is None:
+            continue
+        key = key.replace('-', '_')
+        value = element_to_dict(child)
+        if key not in out:
+            out[key] = value
+        elif isinstance(out[key], list):
+            out[key].append(value)
+        else:
+            out[key] = [out[key], value]
     return out
 
 
@@ -194,7 +339,11 @@ def main():
     argument_spec = netapp_utils.na_ontap_host_argument_spec()
     argument_spec.update(dict(
         state=dict(default='info', choices=['info']),
-        #exclude_snapmirror=dict(default='false'),
+        volumes=dict(type='list', default=None),
+        desired_attributes=dict(type='list', default=['name', 'volume', 'vserver', 'access-time']),
+        max_records=dict(type='int', default=2048),
+        latest=dict(type='bool', default=False),
+        exclude_snapmirror=dict(type='bool', default=False),
     ))
 
     module = AnsibleModule(
@@ -202,12 +351,6 @@ def main():
         supports_check_mode=True
     )
 
-    if not HAS_XMLTODICT:
-        module.fail_json(msg="xmltodict missing")
-
-    if not HAS_JSON:
-        module.fail_json(msg="json missing")
-
     state = module.params['state']
     v = NetAppGatherFacts(module)
     g = v.get_all()
@@ -29,11 +29,47 @@ options:
   parent_volume:
     description:
     - The parent volume of the volume clone being created.
-    required: true
+    - Required unless C(clones) is used.
   volume:
     description:
     - The name of the volume clone being created.
-    required: true
+    - Required unless C(clones) is used.
+  clones:
+    description:
+    - Create many volume clones in one call, instead of parent_volume, volume
+      and parent_snapshot.
+    - Existing clones are looked up with one volume-clone-get-iter query, and
+      the missing ones are created by C(max_concurrent) worker threads. Each
+      worker keeps its own ZAPI connection open for all of its calls.
+    - Other options, such as parent_vserver and space_reserve, apply to every clone.
+    suboptions:
+      parent_volume:
+        description:
+        - The parent volume of the volume clone being created.
+        required: true
+      volume:
+        description:
+        - The name of the volume clone being created.
+        required: true
+      parent_snapshot:
+        description:
+        - Parent snapshot in which volume clone is created off.
+      junction_path:
+        description:
+        - Junction path of the volume clone.
+  max_concurrent:
+    description:
+    - Number of volume-clone-create calls in flight at a time with C(clones).
+    default: 4
+  wait:
+    description:
+    - Wait for each clone to be created.
+    - When false, clones are started with volume-clone-create-async and the
+      module returns their ONTAP job ids in C(jobs) right away. Pass them to
+      fl_na_ontap_job_wait to wait for all of them in one step.
+    - Not supported when cloning accross vservers.
+    type: bool
+    default: true
   vserver:
     description:
     - Vserver in which the volume clone should be created.
@@ -69,13 +105,77 @@ EXAMPLES = """
         volume=clone_volume_7
         space_reserve=none
         parent_snapshot=backup1
+
+    - name: create several volume clones
+      na_ontap_volume_clone:
+        state: present
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        clones:
+          - parent_volume: app1_seed
+            volume: uat1_app1
+            parent_snapshot: daily.0
+          - parent_volume: app2_seed
+            volume: uat1_app2
+            parent_snapshot: daily.0
+        max_concurrent: 8
+
+    - name: start several volume clones without waiting for them
+      na_ontap_volume_clone:
+        state: present
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        clones:
+          - parent_volume: app1_seed
+            volume: uat1_app1
+          - parent_volume: app2_seed
+            volume: uat1_app2
+        wait: false
+      register: clone_jobs
+
+    - name: wait for the clones
+      fl_na_ontap_job_wait:
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        jobs: "{{ clone_jobs.jobs }}"
 """
 
 RETURN = """
+clones:
+    description: Per clone result, keyed by clone volume name. Only returned with C(clones).
+    returned: always
+    type: dict
+    sample: {
+        "uat1_app1": {
+            "changed": true,
+            "seconds": 4.21
+        },
+        "uat1_app2": {
+            "changed": false
+        }
+    }
+jobs:
+    description: ONTAP job id of each clone started, keyed by clone volume name. Only returned when C(wait) is false.
+    returned: always
+    type: dict
+    sample: {
+        "uat1_app1": "1234"
+    }
 """
 
+from multiprocessing.pool import ThreadPool
+import time
+import traceback
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
 import ansible.module_utils.netapp as netapp_utils
+from ansible.module_utils.fl_netapp import ServerPool
 
 HAS_NETAPP_LIB = netapp_utils.has_netapp_lib()
 
@@ -92,8 +192,16 @@ class NetAppOntapVolumeClone(object):
         self.argument_spec = netapp_utils.na_ontap_host_argument_spec()
         self.argument_spec.update(dict(
             state=dict(required=False, choices=['present'], default='present'),
-            parent_volume=dict(required=True, type='str'),
-            volume=dict(required=True, type='str'),
+            parent_volume=dict(required=False, type='str'),
+            volume=dict(required=False, type='str'),
+            clones=dict(required=False, type='list', elements='dict', options=dict(
+                parent_volume=dict(required=True, type='str'),
+                volume=dict(required=True, type='str'),
+                parent_snapshot=dict(required=False, type='str', default=None),
+                junction_path=dict(required=False, type='str', default=None),
+            )),
+            max_concurrent=dict(required=False, type='int', default=4),
+            wait=dict(required=False, type='bool', default=True),
             vserver=dict(required=True, type='str'),
             parent_snapshot=dict(required=False, type='str', default=None),
             parent_vserver=dict(required=False, type='str', default=None),
@@ -105,6 +213,17 @@ class NetAppOntapVolumeClone(object):
 
         self.module = AnsibleModule(
             argument_spec=self.argument_spec,
+            mutually_exclusive=[
+                ['clones', 'volume'],
+                ['clones', 'parent_volume'],
+                ['clones', 'parent_snapshot'],
+            ],
+            required_one_of=[
+                ['clones', 'volume'],
+            ],
+            required_together=[
+                ['volume', 'parent_volume'],
+            ],
             supports_check_mode=True
         )
 
@@ -121,71 +240,190 @@ class NetAppOntapVolumeClone(object):
         self.volume = parameters['volume']
         self.volume_type = parameters['volume_type']
         self.vserver = parameters['vserver']
+        self.clones = parameters['clones']
+        self.max_concurrent = parameters['max_concurrent']
+        self.wait = parameters['wait']
         if not self.parent_vserver:
             self.parent_vserver = self.vserver
-            
+        if not self.wait and self.parent_vserver != self.vserver:
+            self.module.fail_json(msg="wait=false is not supported when cloning accross vservers")
+
         if HAS_NETAPP_LIB is False:
             self.module.fail_json(msg="the python NetApp-Lib module is required")
         else:
-            self.server = netapp_utils.setup_na_ontap_zapi(module=self.module, vserver=self.vserver)
+            # every thread, the batch workers included, gets its own kept-alive
+            # connection from the pool
+            self.servers = ServerPool(self.module, self.vserver)
+            self.server = self.servers.get()
+            # cloning accross vservers goes through the cluster, not the vserver.
+            # a second, untunneled pool is set up for it, so the batch workers
+            # never have to change the vserver of a server.
+            self.cluster_servers = self.servers
+            if self.parent_vserver != self.vserver:
+                self.cluster_servers = ServerPool(self.module)
         return
 
-    def create_volume_clone(self):
+    def create_volume_clone(self, clone):
         """
-        Creates a new volume clone
+        Creates a new volume clone. clone is one entry of the clones option.
+        Without wait, the clone is only started, and its job id is returned
         """
-        clone_obj = netapp_utils.zapi.NaElement('volume-clone-create')
-        clone_obj.add_new_child("parent-volume", self.parent_volume)
-        clone_obj.add_new_child("volume", self.volume)
+        if self.wait:
+            clone_obj = netapp_utils.zapi.NaElement('volume-clone-create')
+        else:
+            clone_obj = netapp_utils.zapi.NaElement('volume-clone-create-async')
+        clone_obj.add_new_child("parent-volume", clone['parent_volume'])
+        clone_obj.add_new_child("volume", clone['volume'])
         if self.qos_policy_group_name:
             clone_obj.add_new_child("qos-policy-group-name", self.qos_policy_group_name)
         if self.space_reserve:
             clone_obj.add_new_child("space-reserve", self.space_reserve)
-        if self.parent_snapshot:
-            clone_obj.add_new_child("parent-snapshot", self.parent_snapshot)
+        if clone['parent_snapshot']:
+            clone_obj.add_new_child("parent-snapshot", clone['parent_snapshot'])
         if self.parent_vserver != self.vserver:
             clone_obj.add_new_child("parent-vserver", self.parent_vserver)
             clone_obj.add_new_child("vserver", self.vserver)
-            # clear vserver specific connection setting when cloning accross vservers
-            self.server.set_vserver(None)
         if self.volume_type:
             clone_obj.add_new_child("volume-type", self.volume_type)
-        if self.junction_path:
-            clone_obj.add_new_child("junction-path", self.junction_path)
-        self.server.invoke_successfully(clone_obj, True)
+        if clone['junction_path']:
+            clone_obj.add_new_child("junction-path", clone['junction_path'])
+        result = self.cluster_servers.get().invoke_successfully(clone_obj, True)
 
-    def does_volume_clone_exists(self):
-        clone_obj = netapp_utils.zapi.NaElement('volume-clone-get')
-        clone_obj.add_new_child("volume", self.volume)
+        if self.wait:
+            return None
+        if result.get_child_content('result-status') == 'failed':
+            raise netapp_utils.zapi.NaApiError(result.get_child_content('result-error-code'),
+                                               result.get_child_content('result-error-message'))
+        # no job id means it already completed
+        return result.get_child_content('result-jobid')
+
+    def create_volume_clone_safe(self, clone):
+        """
+        Runs in a worker thread. Returns the clone's result instead of failing
+        the module, so one bad clone doesn't stop the rest of the batch
+        """
+        start = time.time()
+        result = dict(changed=True)
         try:
-            results = self.server.invoke_successfully(clone_obj, True)
-        except:
-            return False
-        attributes = results.get_child_by_name('attributes')
-        info = attributes.get_child_by_name('volume-clone-info')
-        parent_volume = info.get_child_content('parent-volume')
-        parent_vserver = info.get_child_content('parent-vserver')
-        if parent_volume == self.parent_volume and parent_vserver == self.parent_vserver:
-            return True
-        self.module.fail_json(msg="Error clone %s already exists for parent %s" % (self.volume, parent_volume))
+            job_id = self.create_volume_clone(clone)
+            if job_id:
+                result['job_id'] = job_id
+        except netapp_utils.zapi.NaApiError as error:
+            result = dict(changed=False, msg="Error creating volume clone %s: %s" % (clone['volume'], to_native(error)))
+        except Exception as error:
+            result = dict(changed=False, msg="Error creating volume clone %s: %s" % (clone['volume'], to_native(error)),
+                          exception=traceback.format_exc())
+        result['seconds'] = round(time.time() - start, 2)
+        return result
+
+    def get_existing_clones(self, volumes):
+        """
+        Looks up every clone in volumes with one volume-clone-get-iter query,
+        following next-tag. Returns a dict of volume -> (parent volume, parent vserver)
+        """
+        existing = dict()
+        tag = None
+        while True:
+            clone_iter = netapp_utils.zapi.NaElement('volume-clone-get-iter')
+            clone_iter.add_new_child('max-records', '1000')
+            if tag:
+                clone_iter.add_new_child('tag', tag)
+
+            clone_info = netapp_utils.zapi.NaElement('volume-clone-info')
+            clone_info.add_new_child('volume', '|'.join(volumes))
+            query = netapp_utils.zapi.NaElement('query')
+            query.add_child_elem(clone_info)
+            clone_iter.add_child_elem(query)
+
+            desired_info = netapp_utils.zapi.NaElement('volume-clone-info')
+            for attribute in ['volume', 'parent-volume', 'parent-vserver']:
+                desired_info.add_child_elem(netapp_utils.zapi.NaElement(attribute))
+            desired_attributes = netapp_utils.zapi.NaElement('desired-attributes')
+            desired_attributes.add_child_elem(desired_info)
+            clone_iter.add_child_elem(desired_attributes)
+
+            try:
+                results = self.server.invoke_successfully(clone_iter, True)
+            except netapp_utils.zapi.NaApiError as error:
+                self.module.fail_json(msg="Error fetching volume clones: %s" % to_native(error),
+                                      exception=traceback.format_exc())
+
+            attributes_list = results.get_child_by_name('attributes-list')
+            if attributes_list is not None:
+                for info in attributes_list.get_children():
+                    existing[info.get_child_content('volume')] = (info.get_child_content('parent-volume'),
+                                                                  info.get_child_content('parent-vserver'))
+
+            tag = results.get_child_content('next-tag')
+            if not tag:
+                break
+
+        return existing
 
     def apply(self):
         """
         Run Module based on play book
         """
-        changed = False
+        # a single volume/parent_volume is handled as a batch of one
+        batch = self.clones is not None
+        clones = self.clones
+        if not batch:
+            clones = [dict(parent_volume=self.parent_volume, volume=self.volume,
+                           parent_snapshot=self.parent_snapshot, junction_path=self.junction_path)]
+
         netapp_utils.ems_log_event("na_ontap_volume_clone", self.server)
-        existing_volume_clone = self.does_volume_clone_exists()
+        existing = self.get_existing_clones([clone['volume'] for clone in clones])
 
-        if existing_volume_clone is False:  # create clone
-            changed = True
-        if changed:
-            if self.module.check_mode:
-                pass
+        results = dict()
+        pending = []
+        for clone in clones:
+            if clone['volume'] not in existing:
+                pending.append(clone)
+                continue
+            parent_volume, parent_vserver = existing[clone['volume']]
+            if parent_volume == clone['parent_volume'] and parent_vserver == self.parent_vserver:
+                results[clone['volume']] = dict(changed=False)
             else:
-                self.create_volume_clone()
+                results[clone['volume']] = dict(changed=False, msg="Error clone %s already exists for parent %s" %
+                                                                   (clone['volume'], parent_volume))
+
+        if pending and self.module.check_mode:
+            for clone in pending:
+                results[clone['volume']] = dict(changed=True)
+        elif pending:
+            # each worker reuses one connection for all of its clones. the batch
+            # logs one EMS event however many clones it holds
+            pool = ThreadPool(max(min(self.max_concurrent, len(pending)), 1))
+            try:
+                created = pool.map(self.create_volume_clone_safe, pending)
+            finally:
+                pool.close()
+                pool.join()
+                self.servers.close()
+                self.cluster_servers.close()
+            for clone, result in zip(pending, created):
+                results[clone['volume']] = result
+
+        changed = any(result['changed'] for result in results.values())
+        failed = sorted(volume for volume in results if 'msg' in results[volume])
+
+        # job handles of the clones started, for fl_na_ontap_job_wait
+        extra = dict()
+        if not self.wait:
+            extra['jobs'] = dict((volume, result['job_id']) for volume, result in results.items()
+                                 if 'job_id' in result)
+
+        if not batch:
+            result = results[self.volume]
+            if failed:
+                self.module.fail_json(**result)
+            self.module.exit_json(changed=changed, **extra)
 
-        self.module.exit_json(changed=changed)
+        if failed:
+            self.module.fail_json(msg="Failed to create %d of %d volume clones: %s" %
+                                      (len(failed), len(results), ', '.join(failed)),
+                                  changed=changed, clones=results, **extra)
+        self.module.exit_json(changed=changed, clones=results, **extra)
 
 
 def main():
@@ -0,0 +1,235 @@
+#!/usr/bin/python
+
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+module: fl_na_ontap_volume_delete_batch
+short_description: Delete many NetApp ONTAP volumes in one call.
+extends_documentation_fragment:
+    - netapp.na_ontap
+description:
+- Deletes every volume in C(volumes), in one module run.
+- The volume-destroy calls run on C(max_concurrent) worker threads, each of which keeps its own ZAPI
+  connection open for all of its calls.
+- Which volumes exist, and their state, is read with one volume-get-iter query. Volumes that are
+  already gone are left alone.
+- Each volume is unmounted, taken offline and destroyed with one volume-destroy call.
+options:
+  volumes:
+    description:
+    - Names of the volumes to delete.
+    required: true
+  vserver:
+    description:
+    - Vserver the volumes are in.
+    required: true
+  max_concurrent:
+    description:
+    - Number of volume-destroy calls in flight at a time.
+    default: 4
+'''
+
+EXAMPLES = """
+    - name: delete every volume of a UAT
+      fl_na_ontap_volume_delete_batch:
+        username: admin
+        password: netapp1!
+        hostname: 10.193.74.27
+        vserver: vs_hack
+        volumes:
+          - uat1_app1
+          - uat1_app2
+"""
+
+RETURN = """
+volumes:
+    description: Per volume result, keyed by volume name.
+    returned: always
+    type: dict
+    sample: {
+        "uat1_app1": {
+            "changed": true,
+            "state": "online",
+            "seconds": 2.31
+        },
+        "uat1_app2": {
+            "changed": false
+        }
+    }
+"""
+
+from multiprocessing.pool import ThreadPool
+import time
+import traceback
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+import ansible.module_utils.netapp as netapp_utils
+from ansible.module_utils.fl_netapp import ServerPool
+
+HAS_NETAPP_LIB = netapp_utils.has_netapp_lib()
+
+
+class NetAppOntapVolumeDeleteBatch(object):
+    """
+        Deletes volumes
+    """
+
+    def __init__(self):
+        """
+            Initialize the NetAppOntapVolumeDeleteBatch class
+        """
+        self.argument_spec = netapp_utils.na_ontap_host_argument_spec()
+        self.argument_spec.update(dict(
+            volumes=dict(required=True, type='list', elements='str'),
+            vserver=dict(required=True, type='str'),
+            max_concurrent=dict(required=False, type='int', default=4),
+        ))
+
+        self.module = AnsibleModule(
+            argument_spec=self.argument_spec,
+            supports_check_mode=True
+        )
+
+        parameters = self.module.params
+        self.volumes = parameters['volumes']
+        self.vserver = parameters['vserver']
+        self.max_concurrent = parameters['max_concurrent']
+
+        if HAS_NETAPP_LIB is False:
+            self.module.fail_json(msg="the python NetApp-Lib module is required")
+        else:
+            # every thread, the batch workers included, gets its own kept-alive
+            # connection from the pool
+            self.servers = ServerPool(self.module, self.vserver)
+            self.server = self.servers.get()
+        return
+
+    def get_existing_volumes(self):
+        """
+        Looks up every volume in volumes with one volume-get-iter query,
+        following next-tag. Returns a dict of volume -> state
+        """
+        existing = dict()
+        tag = None
+        while True:
+            volume_iter = netapp_utils.zapi.NaElement('volume-get-iter')
+            volume_iter.add_new_child('max-records', '1000')
+            if tag:
+                volume_iter.add_new_child('tag', tag)
+
+            id_attributes = netapp_utils.zapi.NaElement('volume-id-attributes')
+            id_attributes.add_new_child('name', '|'.join(self.volumes))
+            id_attributes.add_new_child('owning-vserver-name', self.vserver)
+            volume_attributes = netapp_utils.zapi.NaElement('volume-attributes')
+            volume_attributes.add_child_elem(id_attributes)
+            query = netapp_utils.zapi.NaElement('query')
+            query.add_child_elem(volume_attributes)
+            volume_iter.add_child_elem(query)
+
+            desired_id = netapp_utils.zapi.NaElement('volume-id-attributes')
+            desired_id.add_child_elem(netapp_utils.zapi.NaElement('name'))
+            desired_state = netapp_utils.zapi.NaElement('volume-state-attributes')
+            desired_state.add_child_elem(netapp_utils.zapi.NaElement('state'))
+            desired_info = netapp_utils.zapi.NaElement('volume-attributes')
+            desired_info.add_child_elem(desired_id)
+            desired_info.add_child_elem(desired_state)
+            desired_attributes = netapp_utils.zapi.NaElement('desired-attributes')
+            desired_attributes.add_child_elem(desired_info)
+            volume_iter.add_child_elem(desired_attributes)
+
+            try:
+                results = self.server.invoke_successfully(volume_iter, True)
+            except netapp_utils.zapi.NaApiError as error:
+                self.module.fail_json(msg="Error fetching volumes: %s" % to_native(error),
+                                      exception=traceback.format_exc())
+
+            attributes_list = results.get_child_by_name('attributes-list')
+            if attributes_list is not None:
+                for info in attributes_list.get_children():
+                    name = info.get_child_by_name('volume-id-attributes').get_child_content('name')
+                    state_attributes = info.get_child_by_name('volume-state-attributes')
+                    existing[name] = state_attributes.get_child_content('state') if state_attributes is not None else None
+
+            tag = results.get_child_content('next-tag')
+            if not tag:
+                break
+
+        return existing
+
+    def delete_volume_safe(self, volume):
+        """
+        Runs in a worker thread. Deletes volume and returns its result instead
+        of failing the module, so one bad volume doesn't stop the rest
+        """
+        start = time.time()
+        # unmount-and-offline lets an online, mounted volume be destroyed in one call
+        volume_destroy = netapp_utils.zapi.NaElement.create_node_with_children(
+            'volume-destroy', **{'name': volume, 'unmount-and-offline': 'true'})
+        result = dict(changed=True)
+        try:
+            self.servers.get().invoke_successfully(volume_destroy, True)
+        except netapp_utils.zapi.NaApiError as error:
+            result = dict(changed=False, msg="Error deleting volume %s: %s" % (volume, to_native(error)))
+        except Exception as error:
+            result = dict(changed=False, msg="Error deleting volume %s: %s" % (volume, to_native(error)),
+                          exception=traceback.format_exc())
+        result['seconds'] = round(time.time() - start, 2)
+        return result
+
+    def apply(self):
+        """
+        Deletes every volume that still exists
+        """
+        netapp_utils.ems_log_event("fl_na_ontap_volume_delete_batch", self.server)
+        existing = self.get_existing_volumes()
+
+        results = dict()
+        pending = []
+        for volume in self.volumes:
+            if volume in existing:
+                pending.append(volume)
+            else:
+                results[volume] = dict(changed=False)
+
+        if pending and self.module.check_mode:
+            for volume in pending:
+                results[volume] = dict(changed=True, state=existing[volume])
+        elif pending:
+            # each worker reuses one connection for all of its calls
+            pool = ThreadPool(max(min(self.max_concurrent, len(pending)), 1))
+            try:
+                deleted = pool.map(self.delete_volume_safe, pending)
+            finally:
+                pool.close()
+                pool.join()
+                self.servers.close()
+            for volume, result in zip(pending, deleted):
+                result['state'] = existing[volume]
+                results[volume] = result
+
+        changed = any(result['changed'] for result in results.values())
+        failed = sorted(volume for volume in results if 'msg' in results[volume])
+        if failed:
+            self.module.fail_json(msg="Failed to delete %d of %d volumes: %s" % (len(failed), len(results),
+                                                                                 ', '.join(failed)),
+                                  changed=changed, volumes=results)
+        self.module.exit_json(changed=changed, volumes=results)
+
+
+def main():
+    """
+    Creates the NetApp Ontap Volume Delete Batch object and runs the correct play task
+    """
+    obj = NetAppOntapVolumeDeleteBatch()
+    obj.apply()
+
+
+if __name__ == '__main__':
+    main()
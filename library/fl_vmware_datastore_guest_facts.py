@@ -8,31 +8,69 @@ except ImportError:
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_text
-from ansible.module_utils.vmware import PyVmomi, vmware_argument_spec, find_datastore_by_name
+from ansible.module_utils.vmware import vmware_argument_spec, find_datastore_by_name
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, serialize_property
 
 
-class PyVmomiHelper(PyVmomi):
+class PyVmomiHelper(SessionPyVmomi):
     def __init__(self, module):
         super(PyVmomiHelper, self).__init__(module)
 
-        self.datastore_name = module.params['datastore_name']
-        self.ds = self.find_datastore_by_name(self.datastore_name)
-        if self.ds is None:
-            self.module.fail_json(msg="Failed to find datastore %s." % self.datastore_name)
+        # a single datastore_name is handled as a list of one
+        self.datastore_names = module.params['datastores'] or [module.params['datastore_name']]
+
+        # the datastores are found in the inventory index, and their vms read
+        # in one call, rather than a lookup per datastore
+        self.datastores = self.get_datastore_vms(self.datastore_names)
+
+        # a missing datastore fails a single datastore_name. in a list it's
+        # skipped, so a partly torn down UAT can still be cleaned up.
+        self.missing = [name for name in self.datastore_names if name not in self.datastores]
+        if self.missing and not module.params['datastores']:
+            self.module.fail_json(msg="Failed to find datastore %s." % ', '.join(self.missing))
+        for name in self.missing:
+            self.module.warn("Datastore %s not found, skipping it" % name)
+            self.datastore_names.remove(name)
 
     def get_vms(self):
-        '''returns a list of registered VMs on datastore '''
-        return self.ds.vm
+        '''returns a list of registered VMs on the datastores, each vm once '''
+        vms = []
+        seen = set()
+        for name in self.datastore_names:
+            for vm in self.datastores[name]:
+                if vm._moId not in seen:
+                    seen.add(vm._moId)
+                    vms.append(vm)
+        return vms
+
+    def get_vm_properties(self, vms, properties):
+        ''' returns a dict of only the requested properties for every vm, read in one call '''
+        facts = []
+        for vm, props in get_properties(self.content, vim.VirtualMachine, properties, objs=vms):
+            vm_facts = dict((path, serialize_property(value)) for path, value in props.items())
+            vm_facts['moid'] = vm._moId
+            facts.append(vm_facts)
+        return facts
 
 
 def main():
     argument_spec = vmware_argument_spec()
     argument_spec.update(
-        datastore_name=dict(type='str', required=True),
+        datastore_name=dict(type='str'),
+        datastores=dict(type='list', elements='str'),
+        # vm property paths, e.g. name or runtime.powerState. without it the
+        # full gather_facts output of every vm is returned
+        properties=dict(type='list', elements='str'),
     )
 
     module = AnsibleModule(
         argument_spec=argument_spec,
+        mutually_exclusive=[
+            ['datastore_name', 'datastores'],
+        ],
+        required_one_of=[
+            ['datastore_name', 'datastores'],
+        ],
         supports_check_mode=False,
     )
 
@@ -41,6 +79,13 @@ def main():
     # get list of registered vms
     vms = pyv.get_vms()
 
+    if module.params['properties']:
+        try:
+            facts = pyv.get_vm_properties(vms, module.params['properties'])
+        except Exception as exc:
+            module.fail_json(msg="Property retrieval failed with exception %s" % to_text(exc))
+        module.exit_json(instance=facts, missing_datastores=pyv.missing)
+
     facts = []
     for vm in vms:
         try:
@@ -48,7 +93,7 @@ def main():
         except Exception as exc:
             module.fail_json(msg="Fact gather failed with exception %s" % to_text(exc))
 
-    module.exit_json(instance=facts)
+    module.exit_json(instance=facts, missing_datastores=pyv.missing)
 
 if __name__ == '__main__':
     main()
@@ -8,10 +8,11 @@ except ImportError:
 
 import time
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.vmware import vmware_argument_spec, PyVmomi, find_datacenter_by_name, find_datastore_by_name, TaskError
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, run_tasks, wait_for_tasks
 
 
-class VMwareHostDatastore(PyVmomi):
+class VMwareHostDatastore(SessionPyVmomi):
     def __init__(self, module):
         super(VMwareHostDatastore, self).__init__(module)
 
@@ -19,12 +20,13 @@ class VMwareHostDatastore(PyVmomi):
         self.vcenter = module.params['hostname']
         self.datacenter = module.params['datacenter']
         self.datastore = module.params['datastore']
+        self.max_concurrent = module.params['max_concurrent']
 
-        self.dc = find_datacenter_by_name(self.content, self.datacenter)
+        self.dc = self.find_datacenter_by_name(self.datacenter)
         if self.dc is None:
             self.module.fail_json(msg="Failed to find Datacenter %s " % self.datacenter)
 
-        self.ds = find_datastore_by_name(self.content, self.datastore)
+        self.ds = self.find_datastore_by_name(self.datastore)
         if self.ds is None:
             self.module.fail_json(msg="Failed to find Datastore %s " % self.datastore)
 
@@ -33,7 +35,7 @@ class VMwareHostDatastore(PyVmomi):
         if len(self.vswp_files) > 0:
             self.delete_vswp_files()
         else:
-            self.module.exit_json(changed=False)
+            self.module.exit_json(changed=False, files={})
 
     def find_vswp_files(self):
         dsbrowser = self.ds.browser
@@ -41,50 +43,55 @@ class VMwareHostDatastore(PyVmomi):
         search = vim.HostDatastoreBrowserSearchSpec()
         search.matchPattern = "*.vswp"
         search_ds = dsbrowser.SearchDatastoreSubFolders_Task("[%s]" % self.datastore, search)
-        self.wait_for_task(search_ds)
+        search_result = wait_for_tasks(self.content, {'search': search_ds})['search']
+        if not search_result['success']:
+            self.module.fail_json(msg="Failed to search Datastore %s for vswp files: %s" %
+                                      (self.datastore, search_result['msg']))
 
-        for result in search_ds.info.result:
+        for result in search_result['result']:
             dsfolder = result.folderPath
-            for file in result.file:
-                try:
-                    dsfile = file.path
-                    vmfold = dsfolder.split("]")
-                    vmfold = vmfold[1]
-                    vmfold = vmfold[1:]
-                    if ".snapshot" not in vmfold:
-                        vswpurl = "https://%s/folder/%s%s?dcPath=%s&dsName=%s" % \
-                                  (self.vcenter, vmfold, dsfile, self.datacenter, self.datastore)
-                        self.vswp_files.append(vswpurl)
-                except Exception, e:
-                    print "Caught exception : " + str(e)
-                    return -1
+            for file in result.file or []:
+                dsfile = file.path
+                vmfold = dsfolder.split("]")
+                vmfold = vmfold[1]
+                vmfold = vmfold[1:]
+                if ".snapshot" not in vmfold:
+                    vswpurl = "https://%s/folder/%s%s?dcPath=%s&dsName=%s" % \
+                              (self.vcenter, vmfold, dsfile, self.datacenter, self.datastore)
+                    self.vswp_files.append(("[%s] %s%s" % (self.datastore, vmfold, dsfile), vswpurl))
 
     def delete_vswp_files(self):
-        # add check if self.vswp_files empty, return ok
-        for file in self.vswp_files:
-            self.wait_for_task(self.content.fileManager.DeleteFile(file, self.dc))
-
-        self.module.exit_json(changed=True)
-
-    def wait_for_task(self, task):
-        while True:
-            if task.info.state == vim.TaskInfo.State.success:
-                return True, task.info.result
-            if task.info.state == vim.TaskInfo.State.error:
-                try:
-                    raise TaskError(task.info.error)
-                except AttributeError:
-                    raise TaskError("An unknown error has occurred")
-            if task.info.state == vim.TaskInfo.State.running:
-                time.sleep(1)
-            if task.info.state == vim.TaskInfo.State.queued:
-                time.sleep(5)
+        # issue all deletes, up to max_concurrent at a time, and wait on them
+        # together through property change notifications rather than polling
+        start = time.time()
+        jobs = []
+        for name, url in self.vswp_files:
+            jobs.append((name, lambda url=url: self.content.fileManager.DeleteFile(url, self.dc)))
+        task_results = run_tasks(self.content, jobs, max_concurrent=self.max_concurrent)
+
+        files = {}
+        for name, task_result in task_results.items():
+            files[name] = dict(deleted=task_result['success'], seconds=task_result['seconds'])
+            if not task_result['success']:
+                files[name]['msg'] = task_result['msg']
+
+        result = dict(changed=any(file['deleted'] for file in files.values()), files=files,
+                      seconds=round(time.time() - start, 2))
+
+        failed = [name for name in files if not files[name]['deleted']]
+        if failed:
+            self.module.fail_json(msg="Failed to delete %d of %d vswp files: %s" %
+                                      (len(failed), len(files), ', '.join(sorted(failed))), **result)
+
+        self.module.exit_json(**result)
+
 
 def main():
     argument_spec = vmware_argument_spec()
     argument_spec.update(
         datacenter=dict(type='str', required=True),
         datastore=dict(type='str', required=True),
+        max_concurrent=dict(type='int', default=8),
     )
 
     module = AnsibleModule(
@@ -9,39 +9,39 @@ except ImportError:
 
 from uuid import uuid4 as uuid
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_text
-from ansible.module_utils.vmware import PyVmomi, vmware_argument_spec, wait_for_task
+from ansible.module_utils._text import to_native
+from ansible.module_utils.vmware import vmware_argument_spec, wait_for_task
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_tasks
 
 
-def main():
-    argument_spec = vmware_argument_spec()
-    argument_spec.update(
-        name=dict(type='str'),
-        name_match=dict(type='str', choices=['first', 'last'], default='first'),
-        uuid=dict(type='str'),
-    )
+class VMwareGuestUuid(SessionPyVmomi):
+    def __init__(self, module):
+        super(VMwareGuestUuid, self).__init__(module)
 
-    module = AnsibleModule(argument_spec=argument_spec,
-                           supports_check_mode=False,
-                           mutually_exclusive=[
-                               ['name', 'uuid'],
-                           ],
-                           )
-
-    result = dict(changed=False,)
+        self.names = module.params['names']
+        self.folder_path = module.params['folder']
+        self.max_concurrent = module.params['max_concurrent']
 
-    pyv = PyVmomi(module)
+    def get_power_state(self, vm):
+        # only runtime.powerState is read, gather_facts would fetch the vm's
+        # whole hardware, network and custom attribute tree for it
+        for obj, props in get_properties(self.content, vim.VirtualMachine, ['runtime.powerState'], objs=[vm]):
+            return props.get('runtime.powerState')
+        return None
 
-    # Check if the VM exists before continuing
-    vm = pyv.get_vm()
+    def change_uuid(self):
+        ''' changes the bios uuid of the single vm given by name or uuid '''
+        result = dict(changed=False,)
 
-    if vm:
-        facts = pyv.gather_facts(vm)
-        power_state = facts['hw_power_status'].lower()
+        # Check if the VM exists before continuing
+        vm = self.get_vm()
+        if not vm:
+            self.module.fail_json(msg="Unable to set bios uuid for non-existing virtual machine : '%s'" %
+                                      (self.params.get('uuid') or self.params.get('name')))
 
         # VMware will fail the ReconfigVM_Task if the VM is powered on. For idempotency
         # in our UAT automation, we need to exit 'OK' and not change the VM if it is powered on.
-        if power_state == 'poweredoff':
+        if self.get_power_state(vm) == vim.VirtualMachinePowerState.poweredOff:
             result['uuid'] = str(uuid())
             config_spec = vim.vm.ConfigSpec()
             config_spec.uuid = result['uuid']
@@ -52,10 +52,93 @@ def main():
                 self.module.fail_json(msg="Failed to modify bios.uuid of virtual machine due to invalid configuration "
                                           "parameter %s" % to_native(e.msg))
 
-    else:
-        module.fail_json(msg="Unable to set bios uuid for non-existing virtual machine : '%s'" % (module.params.get('uuid') or module.params.get('name')))
+        self.module.exit_json(**result)
+
+    def find_vms(self):
+        ''' returns a dict of name -> (vm, power state) for names, or every vm in folder '''
+        container = None
+        if self.folder_path:
+            container = self.find_by_inventory_path(self.folder_path)
+            if container is None:
+                self.module.fail_json(msg="Failed to find folder '%s'" % self.folder_path)
+
+        # one container view for every vm, however many are asked for
+        names = set(self.names or [])
+        vms = dict()
+        for vm, props in get_properties(self.content, vim.VirtualMachine, ['name', 'runtime.powerState'],
+                                        container=container):
+            if self.names is not None and props.get('name') not in names:
+                continue
+            # with duplicate names the first vm found wins, like name_match=first
+            vms.setdefault(props.get('name'), (vm, props.get('runtime.powerState')))
+        return vms
+
+    def change_uuids(self):
+        ''' changes the bios uuid of every powered off vm in names or folder '''
+        vms = self.find_vms()
+
+        results = dict()
+        for name in self.names or []:
+            if name not in vms:
+                results[name] = dict(changed=False, msg="Unable to set bios uuid for non-existing virtual machine")
+
+        # powered on vms are left alone, see change_uuid()
+        jobs = []
+        for name, (vm, power_state) in vms.items():
+            results[name] = dict(changed=False, power_state=power_state)
+            if power_state != vim.VirtualMachinePowerState.poweredOff:
+                continue
+            config_spec = vim.vm.ConfigSpec()
+            config_spec.uuid = str(uuid())
+            results[name]['uuid'] = config_spec.uuid
+            jobs.append((name, lambda vm=vm, config_spec=config_spec: vm.ReconfigVM_Task(config_spec)))
+
+        for name, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent).items():
+            results[name]['changed'] = task_result['success']
+            results[name]['seconds'] = task_result['seconds']
+            if not task_result['success']:
+                del results[name]['uuid']
+                results[name]['msg'] = "Failed to modify bios.uuid of virtual machine: %s" % task_result['msg']
 
-    module.exit_json(**result)
+        result = dict(changed=any(vm['changed'] for vm in results.values()), vms=results)
+
+        failed = sorted(name for name in results if 'msg' in results[name])
+        if failed:
+            self.module.fail_json(msg="Failed to set bios uuid of %d of %d virtual machines: %s" %
+                                      (len(failed), len(results), ', '.join(failed)), **result)
+
+        self.module.exit_json(**result)
+
+
+def main():
+    argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        name=dict(type='str'),
+        name_match=dict(type='str', choices=['first', 'last'], default='first'),
+        uuid=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        folder=dict(type='str'),
+        max_concurrent=dict(type='int', default=8),
+    )
+
+    module = AnsibleModule(argument_spec=argument_spec,
+                           supports_check_mode=False,
+                           mutually_exclusive=[
+                               ['name', 'uuid', 'names'],
+                               ['name', 'uuid', 'folder'],
+                           ],
+                           required_one_of=[
+                               ['name', 'uuid', 'names', 'folder'],
+                           ],
+                           )
+
+    pyv = VMwareGuestUuid(module)
+
+    # names and/or folder change every vm found in one go, name or uuid a single vm
+    if module.params['names'] is not None or module.params['folder']:
+        pyv.change_uuids()
+    else:
+        pyv.change_uuid()
 
 
 if __name__ == '__main__':
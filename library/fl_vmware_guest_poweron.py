@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+
+try:
+    from pyVmomi import vim, vmodl
+except ImportError:
+    pass
+
+import time
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_tasks, wait_for_property
+
+
+class VMwareGuestPowerOn(SessionPyVmomi):
+    def __init__(self, module):
+        super(VMwareGuestPowerOn, self).__init__(module)
+
+        self.names = module.params['names']
+        self.folder_path = module.params['folder']
+        self.datastore_names = module.params['datastores']
+        self.max_concurrent = module.params['max_concurrent']
+        self.wait_for_tools = module.params['wait_for_tools']
+        self.timeout = module.params['timeout']
+
+    def find_vms(self):
+        ''' returns a dict of name -> (vm, power state) for the vms selected by names, folder and/or datastores '''
+        container = None
+        if self.folder_path:
+            container = self.find_by_inventory_path(self.folder_path)
+            if container is None:
+                self.module.fail_json(msg="Failed to find folder '%s'" % self.folder_path)
+
+        objs = None
+        if self.datastore_names:
+            objs = []
+            datastores = self.get_datastore_vms(self.datastore_names)
+            for datastore_vms in datastores.values():
+                objs.extend(datastore_vms)
+            missing = sorted(set(self.datastore_names) - set(datastores))
+            if missing:
+                self.module.fail_json(msg="Failed to find datastore %s" % ', '.join(missing))
+
+        # vms from datastores are read directly, otherwise through one container
+        # view of the folder or the whole inventory
+        names = set(self.names or [])
+        vms = dict()
+        for vm, props in get_properties(self.content, vim.VirtualMachine, ['name', 'runtime.powerState'],
+                                        objs=objs, container=container):
+            if self.names is not None and props.get('name') not in names:
+                continue
+            # with duplicate names the first vm found wins, like name_match=first
+            vms.setdefault(props.get('name'), (vm, props.get('runtime.powerState')))
+        return vms
+
+    def power_on(self):
+        start = time.time()
+        vms = self.find_vms()
+
+        results = dict()
+        for name in self.names or []:
+            if name not in vms:
+                results[name] = dict(changed=False, msg="Unable to find virtual machine")
+
+        # power on everything that's off, up to max_concurrent at a time. when
+        # each power on is submitted is kept to time how long tools take
+        jobs = []
+        submitted = dict()
+
+        def submit(name, vm):
+            submitted[name] = time.time()
+            return vm.PowerOnVM_Task()
+
+        for name, (vm, power_state) in vms.items():
+            results[name] = dict(changed=False, power_state=power_state)
+            if power_state != vim.VirtualMachinePowerState.poweredOn:
+                jobs.append((name, lambda name=name, vm=vm: submit(name, vm)))
+        for name, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent,
+                                           timeout=self.timeout).items():
+            results[name]['changed'] = task_result['success']
+            results[name]['power_on_seconds'] = task_result['seconds']
+            if task_result['success']:
+                results[name]['power_state'] = vim.VirtualMachinePowerState.poweredOn
+            else:
+                results[name]['msg'] = "Failed to power on: %s" % task_result['msg']
+
+        # then watch tools come up on all of them at once. time to tools is
+        # counted from the vm's power on submit, or from the start of the wait
+        # for vms that were already on
+        if self.wait_for_tools:
+            running = [vm for name, (vm, power_state) in vms.items() if 'msg' not in results[name]]
+            remaining = max(self.timeout - (time.time() - start), 1)
+            tools_start = time.time()
+            tools = wait_for_property(self.content, vim.VirtualMachine, running, 'guest.toolsRunningStatus',
+                                      lambda status: status == vim.vm.GuestInfo.ToolsRunningStatus.guestToolsRunning,
+                                      timeout=remaining)
+            for name, (vm, power_state) in vms.items():
+                if vm._moId not in tools:
+                    continue
+                if tools[vm._moId] is None:
+                    results[name]['msg'] = "VMware tools did not start within %d seconds" % self.timeout
+                else:
+                    results[name]['tools_seconds'] = round(tools_start + tools[vm._moId] -
+                                                           submitted.get(name, tools_start), 2)
+
+        result = dict(changed=any(vm['changed'] for vm in results.values()), vms=results,
+                      seconds=round(time.time() - start, 2))
+
+        failed = sorted(name for name in results if 'msg' in results[name])
+        if failed:
+            self.module.fail_json(msg="%d of %d VMs did not power on%s: %s" %
+                                      (len(failed), len(results), ' with VMware tools' if self.wait_for_tools else '',
+                                       ', '.join(failed)), **result)
+
+        self.module.exit_json(**result)
+
+
+def main():
+    argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        names=dict(type='list', elements='str'),
+        folder=dict(type='str'),
+        datastores=dict(type='list', elements='str'),
+        max_concurrent=dict(type='int', default=8),
+        wait_for_tools=dict(type='bool', default=True),
+        timeout=dict(type='int', default=300),
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        mutually_exclusive=[
+            ['folder', 'datastores'],
+        ],
+        required_one_of=[
+            ['names', 'folder', 'datastores'],
+        ],
+        supports_check_mode=False,
+    )
+
+    pyv = VMwareGuestPowerOn(module)
+    pyv.power_on()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+
+try:
+    from pyVmomi import vim
+except ImportError:
+    pass
+
+import time
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_calls
+
+
+class VMwareHostNasDatastores(SessionPyVmomi):
+    def __init__(self, module):
+        super(VMwareHostNasDatastores, self).__init__(module)
+
+        self.datacenter_name = module.params['datacenter']
+        self.cluster_name = module.params['cluster']
+        self.datastores = module.params['datastores']
+        self.nfs_type = module.params['nfs_type']
+        self.state = module.params['state']
+        self.max_concurrent = module.params['max_concurrent']
+        self.timeout = module.params['timeout']
+
+        if self.state == 'present':
+            missing = [ds['name'] for ds in self.datastores if not ds['nfs_server'] or not ds['nfs_path']]
+            if missing:
+                self.module.fail_json(msg="nfs_server and nfs_path are required to mount datastore %s"
+                                          % ', '.join(missing))
+
+    def find_hosts(self):
+        ''' returns a dict of host name -> (datastore system, {mounted datastore name: datastore}) for the cluster '''
+        datacenter = None
+        if self.datacenter_name:
+            datacenter = self.find_datacenter_by_name(self.datacenter_name)
+            if datacenter is None:
+                self.module.fail_json(msg="Failed to find datacenter %s" % self.datacenter_name)
+        cluster = self.find_cluster_by_name(self.cluster_name, datacenter)
+        if cluster is None:
+            self.module.fail_json(msg="Failed to find cluster %s" % self.cluster_name)
+
+        # every host of the cluster and what it has mounted, in two calls
+        hosts = get_properties(self.content, vim.HostSystem, ['name', 'runtime.connectionState',
+                                                              'configManager.datastoreSystem', 'datastore'],
+                               container=cluster)
+        mounted = []
+        for host, props in hosts:
+            mounted.extend(props.get('datastore') or [])
+        names = dict((ds._moId, props.get('name')) for ds, props in
+                     get_properties(self.content, vim.Datastore, ['name'], objs=list(set(mounted))))
+
+        found = dict()
+        for host, props in hosts:
+            # a host that's down can't mount or unmount anything, it's left for the user to fix
+            if props.get('runtime.connectionState') != vim.HostSystem.ConnectionState.connected:
+                self.module.warn("ESXi host %s is %s, skipping it" % (props.get('name'),
+                                                                     props.get('runtime.connectionState')))
+                continue
+            found[props['name']] = (props['configManager.datastoreSystem'],
+                                    dict((names.get(ds._moId), ds) for ds in props.get('datastore') or []))
+        return found
+
+    def nas_spec(self, datastore):
+        spec = vim.host.NasVolume.Specification()
+        spec.localPath = datastore['name']
+        spec.remoteHost = datastore['nfs_server']
+        spec.remotePath = datastore['nfs_path']
+        spec.accessMode = 'readOnly' if datastore['nfs_ro'] else 'readWrite'
+        if self.nfs_type == 'nfs41':
+            spec.type = 'NFS41'
+            spec.remoteHostNames = [datastore['nfs_server']]
+        else:
+            spec.type = 'NFS'
+        return spec
+
+    def apply(self):
+        start = time.time()
+        hosts = self.find_hosts()
+        if not hosts:
+            self.module.fail_json(msg="Failed to find any connected ESXi hosts in cluster %s" % self.cluster_name)
+
+        # host x datastore matrix. only the cells that need a change become a
+        # call, every call of every host runs at once up to max_concurrent
+        results = dict()
+        jobs = []
+        for host_name, (datastore_system, mounted) in hosts.items():
+            results[host_name] = dict()
+            for datastore in self.datastores:
+                name = datastore['name']
+                results[host_name][name] = dict(changed=False, mounted=name in mounted)
+                if self.state == 'present' and name not in mounted:
+                    spec = self.nas_spec(datastore)
+                    jobs.append(((host_name, name),
+                                 lambda ds_system=datastore_system, spec=spec: ds_system.CreateNasDatastore(spec)))
+                elif self.state == 'absent' and name in mounted:
+                    jobs.append(((host_name, name),
+                                 lambda ds_system=datastore_system, ds=mounted[name]: ds_system.RemoveDatastore(ds)))
+
+        for (host_name, name), call_result in run_calls(jobs, max_concurrent=self.max_concurrent,
+                                                        timeout=self.timeout).items():
+            cell = results[host_name][name]
+            cell['seconds'] = call_result['seconds']
+            if call_result['success']:
+                cell['changed'] = True
+                cell['mounted'] = self.state == 'present'
+            else:
+                cell['msg'] = "Failed to %s: %s" % ('mount' if self.state == 'present' else 'unmount',
+                                                    call_result['msg'])
+
+        result = dict(changed=any(cell['changed'] for cells in results.values() for cell in cells.values()),
+                      hosts=results, seconds=round(time.time() - start, 2))
+
+        failed = sorted('%s on %s' % (name, host_name) for host_name, cells in results.items()
+                        for name, cell in cells.items() if 'msg' in cell)
+        if failed:
+            self.module.fail_json(msg="Failed to %s %d of %d datastores: %s" %
+                                      ('mount' if self.state == 'present' else 'unmount', len(failed),
+                                       len(hosts) * len(self.datastores), ', '.join(failed)), **result)
+
+        self.module.exit_json(**result)
+
+
+def main():
+    argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        datacenter=dict(type='str'),
+        cluster=dict(type='str', required=True),
+        # only name is needed to unmount
+        datastores=dict(type='list', elements='dict', required=True,
+                        options=dict(
+                            name=dict(type='str', required=True),
+                            nfs_server=dict(type='str'),
+                            nfs_path=dict(type='str'),
+                            nfs_ro=dict(type='bool', default=False),
+                        )),
+        nfs_type=dict(type='str', choices=['nfs', 'nfs41'], default='nfs'),
+        state=dict(type='str', choices=['present', 'absent'], default='present'),
+        max_concurrent=dict(type='int', default=8),
+        timeout=dict(type='int', default=600),
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=False,
+    )
+
+    pyv = VMwareHostNasDatastores(module)
+    pyv.apply()
+
+
+if __name__ == '__main__':
+    main()
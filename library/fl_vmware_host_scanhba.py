@@ -20,7 +20,9 @@ module: vmware_host_scanhba
 short_description: Multi-thread rescan host HBA's and optionally refresh the storage system (rescan VMFS).
 description:
 - This module can force a rescan of the hosts HBA subsystem which is needed when wanting to mount a new datastore.
-- Module spawns a seperate thread for each host being rescanned. This is to speed up rescan times on clusters with many hosts.
+- Module rescans hosts in parallel on a bounded pool of worker threads. This is to speed up rescan times on clusters with many hosts.
+- vSphere only offers the rescans as blocking calls. A host that doesn't finish within C(timeout) is reported as failed,
+  the module stops waiting on it while the rescan carries on on the host.
 - You could use this before using vmware_host_datastore to mount a new datastore to ensure your device/volume is ready.
 - You can also optionally force a Refresh of the Storage System in vCenter/ESXi Web Client.
 - All parameters and VMware object names are case sensitive.
@@ -48,6 +50,18 @@ options:
     required: false
     default: false
     type: bool
+  max_workers:
+    description:
+    - Maximum number of hosts rescanned at the same time.
+    required: false
+    default: 8
+    type: int
+  timeout:
+    description:
+    - Seconds to wait for each host's rescan, measured from when that host's rescan starts.
+    required: false
+    default: 300
+    type: int
 extends_documentation_fragment: vmware.documentation
 '''
 
@@ -81,13 +95,22 @@ EXAMPLES = r'''
 
 RETURN = r'''
 result:
-    description: return confirmation of requested host and updated / refreshed storage system
+    description: return confirmation of requested host and updated / refreshed storage system, with per host timing
     returned: always
     type: dict
     sample: {
         "esxi01.example.com": {
-            "rescaned_hba": "true",
-            "refreshed_storage": "true"
+            "rescaned_hba": true,
+            "refreshed_storage": true,
+            "hba_seconds": 12.4,
+            "vmfs_seconds": 3.1,
+            "seconds": 15.5
+        },
+        "esxi02.example.com": {
+            "rescaned_hba": false,
+            "refreshed_storage": false,
+            "msg": "Timed out after 300 seconds",
+            "seconds": 300.0
         }
     }
 '''
@@ -98,47 +121,97 @@ except ImportError:
     pass
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.vmware import vmware_argument_spec, PyVmomi, find_obj
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties
 from ansible.module_utils._text import to_native
+from multiprocessing.pool import ThreadPool
 import threading
+import time
 
 
-class VmwareHbaScan(PyVmomi):
+class VmwareHbaScan(SessionPyVmomi):
     def __init__(self, module):
         super(VmwareHbaScan, self).__init__(module)
         self.results = dict(changed=True, result=dict())
-
-    def rescan_host(self, host, refresh_storage):
-        self.results['result'][host.name] = dict()
-        host.configManager.storageSystem.RescanAllHba()
-
-        # Original RefreshStorageSystem() task doesn't rescan VMFS
-        # which is what we really need.
-        if refresh_storage is True:
-            host.configManager.storageSystem.RescanVmfs()
-
-        self.results['result'][host.name]['rescaned_hba'] = True
-        self.results['result'][host.name]['refreshed_storage'] = refresh_storage
-        return None
+        # worker threads record when their host's rescan starts, for the per host timeout
+        self.started = dict()
+        self.lock = threading.Lock()
+
+    def rescan_host(self, host, name, refresh_storage):
+        ''' runs in a worker thread. returns the host's result instead of writing
+        to shared state, and captures errors so they aren't lost with the thread '''
+        start = time.time()
+        with self.lock:
+            self.started[name] = start
+
+        result = dict(rescaned_hba=False, refreshed_storage=False)
+        try:
+            storage_system = host.configManager.storageSystem
+            storage_system.RescanAllHba()
+            result['rescaned_hba'] = True
+            result['hba_seconds'] = round(time.time() - start, 2)
+
+            # Original RefreshStorageSystem() task doesn't rescan VMFS
+            # which is what we really need.
+            if refresh_storage is True:
+                vmfs_start = time.time()
+                storage_system.RescanVmfs()
+                result['refreshed_storage'] = True
+                result['vmfs_seconds'] = round(time.time() - vmfs_start, 2)
+        except Exception as e:
+            result['msg'] = to_native(getattr(e, 'msg', None) or e)
+
+        result['seconds'] = round(time.time() - start, 2)
+        return result
 
     def scan(self):
         esxi_host_name = self.params.get('esxi_hostname', None)
         cluster_name = self.params.get('cluster_name', None)
         refresh_storage = self.params.get('refresh_storage', bool)
+        max_workers = self.params.get('max_workers')
+        timeout = self.params.get('timeout')
         hosts = self.get_all_host_objs(cluster_name=cluster_name, esxi_host_name=esxi_host_name)
 
         if not hosts:
             self.module.fail_json(msg="Failed to find any hosts.")
 
-        threads = []
-        for host in hosts:
-            thread = threading.Thread(target=self.rescan_host, args=(host,refresh_storage,))
-            threads.append(thread)
-            thread.start()
-
-        for thread in threads:
-            thread.join()
+        # fetch every host name in one call rather than one per thread
+        names = dict((host, props['name']) for host, props in get_properties(self.content, vim.HostSystem, ['name'],
+                                                                             objs=hosts))
 
+        pool = ThreadPool(max(min(max_workers, len(hosts)), 1))
+        pending = dict()
+        for host in hosts:
+            pending[names[host]] = pool.apply_async(self.rescan_host, (host, names[host], refresh_storage))
+        pool.close()
+
+        while pending:
+            for name, async_result in list(pending.items()):
+                if async_result.ready():
+                    self.results['result'][name] = async_result.get()
+                    del pending[name]
+                    continue
+
+                with self.lock:
+                    started = self.started.get(name)
+                if started is not None and time.time() - started > timeout:
+                    self.results['result'][name] = dict(rescaned_hba=False, refreshed_storage=False,
+                                                        msg="Timed out after %d seconds" % timeout,
+                                                        seconds=round(time.time() - started, 2))
+                    del pending[name]
+
+            if pending:
+                # block on any one outstanding host for a moment before checking again
+                list(pending.values())[0].wait(0.5)
+
+        failed = sorted(name for name, result in self.results['result'].items() if 'msg' in result)
+        if failed:
+            self.module.fail_json(msg="Rescan failed on %d of %d hosts: %s" % (len(failed), len(hosts), ', '.join(failed)),
+                                  **self.results)
+
+        # every host finished, so this returns right away. a timed out host would
+        # have kept join() waiting, which is why it's not called before fail_json
+        pool.join()
         self.module.exit_json(**self.results)
 
 
@@ -147,7 +220,9 @@ def main():
     argument_spec.update(
         esxi_hostname=dict(type='str', required=False),
         cluster_name=dict(type='str', required=False),
-        refresh_storage=dict(type='bool', default=False, required=False)
+        refresh_storage=dict(type='bool', default=False, required=False),
+        max_workers=dict(type='int', default=8, required=False),
+        timeout=dict(type='int', default=300, required=False),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
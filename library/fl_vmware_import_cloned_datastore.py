@@ -7,79 +7,136 @@ except ImportError:
     pass
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.vmware import vmware_argument_spec, PyVmomi, find_datastore_by_name, wait_for_task, find_obj
+from ansible.module_utils._text import to_native
+from ansible.module_utils.vmware import vmware_argument_spec, find_datastore_by_name, wait_for_task
+from ansible.module_utils.fl_vmware import SessionPyVmomi, run_tasks, wait_for_tasks
 
 
-class VMwareHostDatastore(PyVmomi):
+class VMwareHostDatastore(SessionPyVmomi):
     def __init__(self, module):
         super(VMwareHostDatastore, self).__init__(module)
 
         self.datacenter_name = module.params['datacenter_name']
-        self.datastore_name = module.params['datastore_name']
         self.esxi_hostname = module.params['esxi_hostname']
-        self.esxi_hostname = module.params['esxi_hostname']
-        self.vmfs_device_name = module.params['vmfs_device_name']
         self.folder_name = module.params['folder_name']
+        self.max_concurrent = module.params['max_concurrent']
+
+        # a single datastore_name/vmfs_device_name is handled as a batch of one
+        self.datastores = module.params['datastores']
+        if not self.datastores:
+            self.datastores = [dict(datastore_name=module.params['datastore_name'],
+                                    vmfs_device_name=module.params['vmfs_device_name'])]
 
         self.esxi = self.find_hostsystem_by_name(self.esxi_hostname)
         if self.esxi is None:
             self.module.fail_json(msg="Failed to find ESXi hostname %s." % self.esxi_hostname)
 
+        self.folder = None
         if self.folder_name:
-            self.folder = find_obj(self.content, [vim.Folder], self.folder_name, first=True)
+            self.folder = self.find_folder_by_name(self.folder_name)
             if self.folder is None:
                 self.module.fail_json(msg="Failed to find storage folder '%s'. Make sure the folder exists, "
                                           "or remove module parameter folder_name." % self.folder_name)
 
-        self.check_datastore_host_state()
-
-    def check_datastore_host_state(self):
+    def get_mounted_datastores(self):
         storage_system = self.esxi.configManager.storageSystem
         host_file_sys_vol_mount_info = storage_system.fileSystemVolumeInfo.mountInfo
-        for host_mount_info in host_file_sys_vol_mount_info:
-            # if datastore already mounted, exit module with 'ok' status
-            if host_mount_info.volume.name == self.datastore_name:
-                self.module.exit_json(changed=False)
+        return [host_mount_info.volume.name for host_mount_info in host_file_sys_vol_mount_info]
 
     def mount_vmfs_datastore_host(self):
         host_ds_system = self.esxi.configManager.datastoreSystem
+        results = {}
 
-        # create list of available disks that the esxi host can see
-        available_vmfs_disks = []
-        for disk in host_ds_system.QueryAvailableDisksForVmfs():
-            available_vmfs_disks.append(disk.canonicalName)
-
-        if self.vmfs_device_name not in available_vmfs_disks:
-            self.module.fail_json(msg="VMFS device specified is not available on host %s" % self.esxi_hostname,
-                                  available_vmfs_disks=available_vmfs_disks)
-
-        spec = vim.host.UnresolvedVmfsResignatureSpec()
-        spec.extentDevicePath = '/vmfs/devices/disks/%s:1' % self.vmfs_device_name
+        # datastores already mounted are left alone, for idempotence
+        mounted = self.get_mounted_datastores()
+        pending = []
+        for item in self.datastores:
+            if item['datastore_name'] in mounted:
+                results[item['datastore_name']] = dict(imported=False, changed=False)
+            else:
+                pending.append(item)
 
-        # probably don't need to assign return values of 'wait_for_task'
-        changed, result = wait_for_task(host_ds_system.ResignatureUnresolvedVmfsVolume(spec))
-        # the result of 'result' is the datastore object.
-        # TODO: error handling for below tasks. Can't use wait_for_task as these tasks
-        # don't have a task.info.result, leading to the error: AttributeError: 'NoneType' object has no attribute 'info'
-        ds = result.result
-        ds.RenameDatastore(self.datastore_name)
-        if self.folder:
-            self.folder.MoveInto([ds])
-
-        self.module.exit_json(changed=changed)
+        available_vmfs_disks = []
+        if pending:
+            # create list of available disks that the esxi host can see. queried
+            # once for the whole batch.
+            for disk in host_ds_system.QueryAvailableDisksForVmfs():
+                available_vmfs_disks.append(disk.canonicalName)
+
+        jobs = []
+        for item in pending:
+            if item['vmfs_device_name'] not in available_vmfs_disks:
+                results[item['datastore_name']] = dict(imported=False, changed=False,
+                                                       msg="VMFS device %s is not available on host %s" %
+                                                           (item['vmfs_device_name'], self.esxi_hostname))
+                continue
+
+            spec = vim.host.UnresolvedVmfsResignatureSpec()
+            spec.extentDevicePath = '/vmfs/devices/disks/%s:1' % item['vmfs_device_name']
+            jobs.append((item['datastore_name'], lambda spec=spec: host_ds_system.ResignatureUnresolvedVmfsVolume(spec)))
+
+        # resignature with bounded parallelism, then rename each new datastore
+        imported = []
+        for name, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent).items():
+            if not task_result['success']:
+                results[name] = dict(imported=False, changed=False, msg=task_result['msg'])
+                continue
+
+            # the task result is a HostResignatureRescanResult, its 'result' is the datastore object
+            ds = task_result['result'].result
+            results[name] = dict(imported=True, changed=True, seconds=task_result['seconds'])
+            try:
+                ds.RenameDatastore(name)
+            except vmodl.MethodFault as rename_error:
+                results[name]['msg'] = "Resignatured as '%s' but rename failed: %s" % (ds.name, to_native(rename_error.msg))
+                continue
+            imported.append((name, ds))
+
+        # move every imported datastore into the storage folder in one call
+        if self.folder and imported:
+            move_task = self.folder.MoveInto([ds for name, ds in imported])
+            move_result = wait_for_tasks(self.content, {'move': move_task})['move']
+            if not move_result['success']:
+                for name, ds in imported:
+                    results[name]['msg'] = "Failed to move datastore into folder '%s': %s" % \
+                                              (self.folder_name, move_result['msg'])
+
+        result = dict(changed=any(item['changed'] for item in results.values()), datastores=results)
+
+        failed = sorted(name for name in results if 'msg' in results[name])
+        if failed:
+            self.module.fail_json(msg="Failed to import %d of %d datastores: %s" %
+                                      (len(failed), len(results), ', '.join(failed)),
+                                  available_vmfs_disks=available_vmfs_disks, **result)
+
+        self.module.exit_json(**result)
 
 def main():
     argument_spec = vmware_argument_spec()
     argument_spec.update(
         datacenter_name=dict(type='str', required=True),
-        datastore_name=dict(type='str', required=True),
+        datastore_name=dict(type='str'),
         vmfs_device_name=dict(type='str'),
+        datastores=dict(type='list', elements='dict', options=dict(
+            datastore_name=dict(type='str', required=True),
+            vmfs_device_name=dict(type='str', required=True),
+        )),
         esxi_hostname=dict(type='str', required=True),
         folder_name=dict(type='str', required=False),
+        max_concurrent=dict(type='int', default=4),
     )
 
     module = AnsibleModule(
         argument_spec=argument_spec,
+        mutually_exclusive=[
+            ['datastores', 'datastore_name'],
+        ],
+        required_one_of=[
+            ['datastores', 'datastore_name'],
+        ],
+        required_together=[
+            ['datastore_name', 'vmfs_device_name'],
+        ],
         supports_check_mode=False,
     )
 
@@ -1,19 +1,112 @@
 #!usr/bin/env python
 
 
+import base64
 import random
 import re
+import socket
+import threading
 import time
+from multiprocessing.pool import ThreadPool
 from pyVim.connect import SmartConnect
 import ssl
 from pyVmomi import vim, vmodl
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
-from ansible.module_utils.vmware import vmware_argument_spec, PyVmomi, find_datastore_by_name, wait_for_task, find_object_by_name
-from ansible.module_utils.urls import open_url
+from ansible.module_utils._text import to_bytes, to_native, to_text
+from ansible.module_utils.vmware import vmware_argument_spec, find_datastore_by_name, wait_for_task, find_object_by_name
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_tasks
+from ansible.module_utils.six.moves import http_client
 from ansible.module_utils.six.moves.urllib.parse import urlencode, quote
 
-class PyVmomiHelper(PyVmomi):
+# bytes requested per ranged read of a vmx file. most vmx files fit in one read.
+VMX_CHUNK_SIZE = 16384
+
+# host properties read once per module run for vm placement
+HOST_PROPERTIES = [
+    'name',
+    'vm',
+    'runtime.connectionState',
+    'runtime.inMaintenanceMode',
+    'summary.hardware.memorySize',
+    'summary.hardware.cpuMhz',
+    'summary.hardware.numCpuCores',
+    'summary.quickStats.overallMemoryUsage',
+    'summary.quickStats.overallCpuUsage',
+]
+
+
+class HostPlacement(object):
+    '''
+    Picks the ESXi host each VM is registered on. The cluster's hosts and
+    their load are read once, in one PropertyCollector call, and every pick
+    after that is made locally. Strategies:
+      - least_vms: host with the fewest VMs, counting VMs placed by this run
+      - round_robin: cycle through the hosts in name order
+      - weighted: spread VMs in proportion to each host's free memory and CPU
+      - random: the previous behaviour, a random host per VM
+    '''
+
+    def __init__(self, content, cluster, strategy):
+        self.strategy = strategy
+        self.hosts = []
+        self.names = {}
+        self.vm_counts = {}
+        self.weights = {}
+        self.current_weights = {}
+        self.distribution = {}
+        self.picks = 0
+
+        free = {}
+        for host, props in get_properties(content, vim.HostSystem, HOST_PROPERTIES, objs=cluster.host):
+            # only place VMs on hosts that can power them on
+            if props.get('runtime.connectionState') != 'connected' or props.get('runtime.inMaintenanceMode'):
+                continue
+
+            memory_mb = (props.get('summary.hardware.memorySize') or 0) // (1024 * 1024)
+            cpu_mhz = (props.get('summary.hardware.cpuMhz') or 0) * (props.get('summary.hardware.numCpuCores') or 0)
+            free[host] = (max(memory_mb - (props.get('summary.quickStats.overallMemoryUsage') or 0), 0),
+                          max(cpu_mhz - (props.get('summary.quickStats.overallCpuUsage') or 0), 0))
+
+            self.hosts.append(host)
+            self.names[host] = props['name']
+            self.vm_counts[host] = len(props.get('vm') or [])
+            self.distribution[props['name']] = 0
+
+        self.hosts.sort(key=lambda host: self.names[host])
+
+        # each host's share of the cluster's free memory plus its share of free cpu
+        total_memory = sum(memory for memory, cpu in free.values())
+        total_cpu = sum(cpu for memory, cpu in free.values())
+        for host in self.hosts:
+            memory, cpu = free[host]
+            weight = (float(memory) / total_memory if total_memory else 0) + (float(cpu) / total_cpu if total_cpu else 0)
+            self.weights[host] = weight or 1.0 / len(self.hosts)
+            self.current_weights[host] = 0
+
+    def pick(self):
+        if self.strategy == 'round_robin':
+            host = self.hosts[self.picks % len(self.hosts)]
+        elif self.strategy == 'least_vms':
+            host = min(self.hosts, key=lambda host: self.vm_counts[host])
+        elif self.strategy == 'weighted':
+            # smooth weighted round robin, spreads picks evenly while keeping
+            # each host's overall share proportional to its weight
+            for candidate in self.hosts:
+                self.current_weights[candidate] += self.weights[candidate]
+            host = max(self.hosts, key=lambda host: self.current_weights[host])
+            self.current_weights[host] -= sum(self.weights.values())
+        else:
+            host = random.choice(self.hosts)
+
+        self.picks += 1
+        self.vm_counts[host] += 1
+        self.distribution[self.names[host]] += 1
+        return host
+
+    def report(self):
+        return dict(strategy=self.strategy, distribution=self.distribution)
+
+class PyVmomiHelper(SessionPyVmomi):
     def __init__(self, module):
         super(PyVmomiHelper, self).__init__(module)
 
@@ -26,6 +119,18 @@ class PyVmomiHelper(PyVmomi):
         self.cluster = self.params['cluster']
         self.vm_name_prefix = self.params['vm_name_prefix']
         self.vm_folder = self.params['vm_folder'].rstrip('/')
+        self.max_concurrent = self.params['max_concurrent']
+        self.vmx_workers = self.params['vmx_workers']
+        self.placement_strategy = self.params['placement']
+        self.placement = None
+        self.port = self.params['port']
+
+        # each vmx worker thread keeps its own HTTPS connection open across
+        # files. every connection opened is also kept in vmx_connections so
+        # they can all be closed once discovery is done.
+        self.local = threading.local()
+        self.vmx_connections = []
+        self.vmx_connections_lock = threading.Lock()
 
     def vmware_path(self, path):
         # Nick: Is this necissary? use urlencode to do this & collapse into vmx function
@@ -42,27 +147,102 @@ class PyVmomiHelper(PyVmomi):
         params = urlencode(params)
         return "%s?%s" % (path, params)
 
+    def vmx_connection(self):
+        ''' returns the calling thread's keep-alive HTTPS connection to vCenter '''
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if self.validate_certs:
+                context = ssl.create_default_context()
+            else:
+                context = ssl._create_unverified_context()
+            conn = http_client.HTTPSConnection(self.hostname, self.port, timeout=30, context=context)
+            self.local.conn = conn
+            with self.vmx_connections_lock:
+                self.vmx_connections.append(conn)
+        return conn
+
+    def close_vmx_connections(self):
+        ''' closes every connection the vmx workers opened '''
+        with self.vmx_connections_lock:
+            for conn in self.vmx_connections:
+                conn.close()
+            self.vmx_connections = []
+
+    def vmx_headers(self, start):
+        headers = {"Content-Type": "application/octet-stream",
+                   "Range": "bytes=%d-%d" % (start, start + VMX_CHUNK_SIZE - 1)}
+        # reuse the module's vSphere session so datastore reads don't each log in.
+        # fall back to basic auth if the session cookie isn't available.
+        cookie = getattr(self.content.sessionManager._stub, 'cookie', None)
+        if cookie:
+            headers["Cookie"] = cookie
+        else:
+            credentials = to_bytes("%s:%s" % (self.username, self.password))
+            headers["Authorization"] = "Basic %s" % to_text(base64.b64encode(credentials))
+        return headers
+
+    def read_vmx_chunk(self, remote_path, start):
+        ''' reads one range of a datastore file. returns the bytes read and
+        whether the end of the file was reached '''
+        for attempt in range(2):
+            conn = self.vmx_connection()
+            try:
+                conn.request('GET', remote_path, headers=self.vmx_headers(start))
+                resp = conn.getresponse()
+                body = resp.read()
+                break
+            except (http_client.HTTPException, socket.error):
+                # the server may have closed the kept-alive connection, reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+        # range starts past the end of the file
+        if resp.status == 416:
+            return b'', True
+        if resp.status not in [200, 206]:
+            raise Exception("HTTP Error %d: %s" % (resp.status, resp.reason))
+        # 200 means the server ignored the range and sent the whole file
+        if resp.status == 200:
+            return body, True
+
+        total = resp.getheader('Content-Range', '').rpartition('/')[2]
+        return body, not body or not total.isdigit() or start + len(body) >= int(total)
+
     def examine_vmx(self, path):
-        ''' downloads and examines a vmx file to extract vm display name '''
+        ''' reads a vmx file just far enough to extract the vm display name '''
         remote_path = self.vmware_path(path)
-        url = 'https://%s%s' % (self.hostname, remote_path)
-        headers = {"Content-Type": "application/octet-stream"}
-        resp = open_url(url, headers=headers, method='GET', timeout=30, url_username=self.username,
-                        url_password=self.password, validate_certs=self.validate_certs, force_basic_auth=True)
-
-        resp = resp.readlines()
-
-        displayName = None
-        for line in resp:
-            if 'displayName' in line:
-                line = re.sub(r'\n|"', '', line)
-                displayName = line.split(' = ')[1]
-                break
 
-        if not displayName:
-            self.module.fail_json(msg="File '[ %s ] %s' is missing 'displayName' key" % (self.datastore, path))
+        start = 0
+        partial_line = b''
+        while True:
+            chunk, done = self.read_vmx_chunk(remote_path, start)
+            start += len(chunk)
+
+            lines = (partial_line + chunk).split(b'\n')
+            # the last line may continue in the next chunk
+            partial_line = b'' if done else lines.pop()
+            for line in lines:
+                line = to_text(line, errors='surrogate_or_replace')
+                if 'displayName' in line:
+                    line = re.sub(r'\r|"', '', line)
+                    return line.split(' = ')[1]
+
+            if done:
+                return None
+
+    def examine_vmx_safe(self, path):
+        ''' worker wrapper for examine_vmx. module.fail_json can't be called
+        from a worker thread, so errors are returned instead '''
+        try:
+            displayName = self.examine_vmx(path)
+        except Exception as e:
+            return path, None, "Failed to read '[%s] %s': %s" % (self.datastore, path, to_native(e))
 
-        return displayName
+        if not displayName:
+            return path, None, "File '[ %s ] %s' is missing 'displayName' key" % (self.datastore, path)
+        return path, displayName, None
 
     def get_registered_vms(self, datastore):
         # holds a list of vmx files for registered vms
@@ -92,19 +272,42 @@ class PyVmomiHelper(PyVmomi):
 
         # diff list of all found vmx files against list of registered vmx files.
         # this will create our list of vmx files of unregistered vms.
-        unreg_vmx_results = {}
+        unreg_vmx_paths = []
         for result in results:
           # this shouldn't be defined here. should pass in "[ datastore ] folder/file.vmx" to examine vmx
           file = result.file[0].path
           folder = result.folderPath.split("] ")[1]
           path = folder + file
           if (file not in registered_vmx_files and ".snapshot" not in folder):
-            # fetch the displayName from the vmx file. using the vmx file name is
-            # not reliable if the vm was renamed and not storage vmotioned.
-            #
-            # examine_vmx should return a json blob. should we return more besides
-            # displayName and path in the json blob? all vmx info?
-            displayName = self.examine_vmx(path)
+            unreg_vmx_paths.append(path)
+
+        # fetch the displayName from each vmx file. using the vmx file name is
+        # not reliable if the vm was renamed and not storage vmotioned. files are
+        # read concurrently by a bounded pool of workers.
+        #
+        # examine_vmx should return a json blob. should we return more besides
+        # displayName and path in the json blob? all vmx info?
+        examined = []
+        if unreg_vmx_paths:
+            pool = ThreadPool(min(self.vmx_workers, len(unreg_vmx_paths)))
+            try:
+                examined = pool.map(self.examine_vmx_safe, unreg_vmx_paths)
+            finally:
+                pool.close()
+                pool.join()
+                # don't hold sockets open while the VMs are registered
+                self.close_vmx_connections()
+
+        # a vmx that can't be read is reported with the others at the end,
+        # keyed by its path since it has no display name
+        unreg_vmx_results = {}
+        for path, displayName, error in examined:
+            if error:
+                unreg_vmx_results[path] = { "path": path,
+                                            "datastore": self.datastore,
+                                            "registered": False,
+                                            "msg": error }
+                continue
             unreg_vmx_results[displayName] = { "path": path,
                                                "datastore": self.datastore }
 
@@ -112,7 +315,7 @@ class PyVmomiHelper(PyVmomi):
 
     def apply(self):
         # Find folder obj to place VM. Search for this first to fail fast.
-        folder = self.content.searchIndex.FindByInventoryPath(self.vm_folder)
+        folder = self.find_by_inventory_path(self.vm_folder)
         if folder is None:
             self.module.fail_json(msg="Folder path '%s' does not exist" % self.vm_folder)
 
@@ -128,6 +331,12 @@ class PyVmomiHelper(PyVmomi):
 
         resource_pool = cluster.resourcePool
 
+        # snapshot the cluster's hosts once, rather than once per VM
+        self.placement = HostPlacement(self.content, cluster, self.placement_strategy)
+        if not self.placement.hosts:
+            self.module.fail_json(msg="No connected ESXi hosts outside of maintenance mode found in cluster '%s'."
+                                      % self.cluster)
+
         datastore = self.find_datastore_by_name(self.datastore)
         if datastore is None:
             self.module.fail_json(msg="Datastore '%s' not found." % self.datastore)
@@ -135,24 +344,38 @@ class PyVmomiHelper(PyVmomi):
         # browse datastore to find unregistered vms
         unreg_vmx_results = self.get_unreg_vms(datastore)
 
-        # Rather than keep track of changed result of all VMs getting registered,
-        # set changed status if there is at least 1 VM that needs registered.
-        if unreg_vmx_results:
-            changed = True
-        else:
-            changed = False
-
+        # submit registrations up to max_concurrent at a time and wait on them
+        # together. a failed registration is reported for that VM only.
+        jobs = []
         for displayName in unreg_vmx_results:
+            if 'msg' in unreg_vmx_results[displayName]:
+                continue
             name = self.vm_name_prefix + displayName
             path = str("[" + self.datastore + "] " + unreg_vmx_results[displayName]["path"])
-            # pick a random esxi host to use for vm registrations
-            esxi = random.choice(self.get_all_hosts_by_cluster(self.cluster))
+            esxi = self.placement.pick()
+            unreg_vmx_results[displayName]['esxi_host'] = self.placement.names[esxi]
 
-            task = folder.RegisterVM_Task(path=path, asTemplate=False, name=name, pool=resource_pool, host=esxi)
-            try:
-                result, info = wait_for_task(task)
-            except Exception as task_e:
-                self.module.fail_json(msg=to_native(task_e))
+            def submit(path=path, name=name, esxi=esxi):
+                return folder.RegisterVM_Task(path=path, asTemplate=False, name=name, pool=resource_pool, host=esxi)
+            jobs.append((displayName, submit))
+
+        task_results = run_tasks(self.content, jobs, max_concurrent=self.max_concurrent)
+
+        for displayName, task_result in task_results.items():
+            unreg_vmx_results[displayName]['registered'] = task_result['success']
+            unreg_vmx_results[displayName]['seconds'] = task_result['seconds']
+            if not task_result['success']:
+                unreg_vmx_results[displayName]['msg'] = task_result['msg']
+
+        # changed if at least 1 VM got registered
+        changed = any(vm.get('registered') for vm in unreg_vmx_results.values())
+
+        failed = [displayName for displayName in unreg_vmx_results if 'msg' in unreg_vmx_results[displayName]]
+        if failed:
+            self.module.fail_json(msg="Failed to register %d of %d VMs: %s" % (len(failed), len(unreg_vmx_results),
+                                                                             ', '.join(sorted(failed))),
+                                  changed=changed, result=unreg_vmx_results,
+                                  placement=self.placement.report())
 
         return changed, unreg_vmx_results
 
@@ -167,7 +390,10 @@ def main():
         cluster=dict(type='str', required=True),
         datastore=dict(type='str', required=True),
         vm_name_prefix=dict(type='str', required=True),
-        vm_folder=dict(type='str', required=True,)
+        vm_folder=dict(type='str', required=True,),
+        max_concurrent=dict(type='int', default=8),
+        vmx_workers=dict(type='int', default=8),
+        placement=dict(type='str', default='least_vms', choices=['least_vms', 'round_robin', 'weighted', 'random']),
     )
 
     module = AnsibleModule(
@@ -182,7 +408,8 @@ def main():
     pyv = PyVmomiHelper(module)
     changed, results = pyv.apply()
 
-    module.exit_json(changed=changed, result=results)
+    placement = pyv.placement.report() if pyv.placement else None
+    module.exit_json(changed=changed, result=results, placement=placement)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+
+try:
+    from pyVmomi import vim
+except ImportError:
+    pass
+
+import time
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_tasks
+
+
+class VMwareRemoveSanDatastores(SessionPyVmomi):
+    def __init__(self, module):
+        super(VMwareRemoveSanDatastores, self).__init__(module)
+
+        self.datastore_names = module.params['datastores']
+        self.folder_name = module.params['folder']
+        self.max_concurrent = module.params['max_concurrent']
+        self.timeout = module.params['timeout']
+
+    def find_datastores(self):
+        ''' returns a dict of datastore name -> (vmfs uuid, disk names, host mounts) for datastores or folder '''
+        container = None
+        if self.folder_name:
+            container = self.find_folder_by_name(self.folder_name)
+            if container is None:
+                self.module.fail_json(msg="Failed to find storage folder '%s'" % self.folder_name)
+
+        names = set(self.datastore_names or [])
+        found = dict()
+        for ds, props in get_properties(self.content, vim.Datastore, ['name', 'summary.type', 'info', 'host'],
+                                        container=container):
+            name = props.get('name')
+            if self.datastore_names is not None and name not in names:
+                continue
+            if props.get('summary.type') != 'VMFS':
+                self.module.warn("Datastore %s is not a VMFS datastore, skipping it" % name)
+                continue
+            vmfs = props['info'].vmfs
+            found[name] = (vmfs.uuid, set(extent.diskName for extent in vmfs.extent or []), props.get('host') or [])
+
+        self.missing = sorted(names - set(found))
+        return found
+
+    def find_hosts(self, hosts):
+        ''' returns a dict of host moId -> (name, storage system, {disk name: scsi lun}) for the connected hosts '''
+        found = dict()
+        for host, props in get_properties(self.content, vim.HostSystem, ['name', 'runtime.connectionState',
+                                                                        'configManager.storageSystem',
+                                                                        'config.storageDevice.scsiLun'],
+                                          objs=hosts):
+            if props.get('runtime.connectionState') != vim.HostSystem.ConnectionState.connected:
+                self.module.warn("ESXi host %s is %s, skipping it" % (props.get('name'),
+                                                                     props.get('runtime.connectionState')))
+                continue
+            luns = dict((lun.canonicalName, lun) for lun in props.get('config.storageDevice.scsiLun') or [])
+            found[host._moId] = (props['name'], props['configManager.storageSystem'], luns)
+        return found
+
+    @staticmethod
+    def faults(task_result):
+        ''' returns a dict of key -> fault message from an Ex task's per volume/lun results '''
+        return dict((item.key, to_native(getattr(item.fault, 'msg', None) or item.fault))
+                    for item in task_result.get('result') or [] if item.fault is not None)
+
+    def remove(self):
+        start = time.time()
+        datastores = self.find_datastores()
+        for name in self.missing:
+            self.module.warn("Datastore %s not found, skipping it" % name)
+
+        mounts = dict()
+        for name, (uuid, disks, host_mounts) in datastores.items():
+            for mount in host_mounts:
+                mounts.setdefault(mount.key._moId, mount.key)
+        hosts = self.find_hosts(list(mounts.values()))
+
+        # host x datastore matrix. every datastore a host still has mounted is
+        # unmounted with one UnmountVmfsVolumeEx_Task per host, then its luns
+        # are detached with one DetachScsiLunEx_Task per host
+        results = dict()
+        unmount = dict()
+        for name, (uuid, disks, host_mounts) in datastores.items():
+            for mount in host_mounts:
+                if mount.key._moId not in hosts:
+                    continue
+                host_name = hosts[mount.key._moId][0]
+                results.setdefault(host_name, dict())[name] = dict(changed=False, unmounted=not mount.mountInfo.mounted,
+                                                                   detached=False)
+                if mount.mountInfo.mounted:
+                    unmount.setdefault(mount.key._moId, []).append(name)
+
+        jobs = []
+        for moid, names in unmount.items():
+            host_name, storage_system, luns = hosts[moid]
+            uuids = [datastores[name][0] for name in names]
+            jobs.append((moid, lambda storage_system=storage_system, uuids=uuids:
+                         storage_system.UnmountVmfsVolumeEx_Task(vmfsUuid=uuids)))
+        for moid, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent,
+                                           timeout=self.timeout).items():
+            host_name = hosts[moid][0]
+            faults = self.faults(task_result)
+            for name in unmount[moid]:
+                cell = results[host_name][name]
+                cell['seconds'] = task_result['seconds']
+                if not task_result['success']:
+                    cell['msg'] = "Failed to unmount: %s" % task_result['msg']
+                elif datastores[name][0] in faults:
+                    cell['msg'] = "Failed to unmount: %s" % faults[datastores[name][0]]
+                else:
+                    cell['changed'] = cell['unmounted'] = True
+
+        # luns of the datastores each host has unmounted, and that aren't detached yet
+        detach = dict()
+        for moid, (host_name, storage_system, luns) in hosts.items():
+            for name, cell in results.get(host_name, {}).items():
+                if not cell['unmounted']:
+                    continue
+                lun_uuids = [luns[disk].uuid for disk in datastores[name][1]
+                             if disk in luns and 'off' not in (luns[disk].operationalState or [])]
+                if lun_uuids:
+                    detach.setdefault(moid, []).append((name, lun_uuids))
+                else:
+                    cell['detached'] = True
+
+        jobs = []
+        for moid, entries in detach.items():
+            storage_system = hosts[moid][1]
+            lun_uuids = [lun_uuid for name, uuids in entries for lun_uuid in uuids]
+            jobs.append((moid, lambda storage_system=storage_system, lun_uuids=lun_uuids:
+                         storage_system.DetachScsiLunEx_Task(lunUuid=lun_uuids)))
+        for moid, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent,
+                                           timeout=self.timeout).items():
+            host_name = hosts[moid][0]
+            faults = self.faults(task_result)
+            for name, lun_uuids in detach[moid]:
+                cell = results[host_name][name]
+                cell['seconds'] = round(cell.get('seconds', 0) + task_result['seconds'], 2)
+                if not task_result['success']:
+                    cell['msg'] = "Failed to detach: %s" % task_result['msg']
+                elif any(lun_uuid in faults for lun_uuid in lun_uuids):
+                    cell['msg'] = "Failed to detach: %s" % ', '.join(faults[lun_uuid] for lun_uuid in lun_uuids
+                                                                     if lun_uuid in faults)
+                else:
+                    cell['changed'] = cell['detached'] = True
+
+        result = dict(changed=any(cell['changed'] for cells in results.values() for cell in cells.values()),
+                      hosts=results, missing_datastores=self.missing, seconds=round(time.time() - start, 2))
+
+        failed = sorted('%s on %s' % (name, host_name) for host_name, cells in results.items()
+                        for name, cell in cells.items() if 'msg' in cell)
+        if failed:
+            self.module.fail_json(msg="Failed to unmount and detach %d of %d datastores: %s" %
+                                      (len(failed), sum(len(cells) for cells in results.values()),
+                                       ', '.join(failed)), **result)
+
+        self.module.exit_json(**result)
+
+
+def main():
+    argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        datastores=dict(type='list', elements='str'),
+        # storage folder, every VMFS datastore in it is removed
+        folder=dict(type='str'),
+        max_concurrent=dict(type='int', default=8),
+        timeout=dict(type='int', default=1800),
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        required_one_of=[
+            ['datastores', 'folder'],
+        ],
+        supports_check_mode=False,
+    )
+
+    pyv = VMwareRemoveSanDatastores(module)
+    pyv.remove()
+
+
+if __name__ == '__main__':
+    main()
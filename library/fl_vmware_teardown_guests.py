@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+
+try:
+    from pyVmomi import vim, vmodl
+except ImportError:
+    pass
+
+import time
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi, get_properties, run_tasks
+
+
+class VMwareGuestTeardown(SessionPyVmomi):
+    def __init__(self, module):
+        super(VMwareGuestTeardown, self).__init__(module)
+
+        self.datastore_names = module.params['datastores']
+        self.max_concurrent = module.params['max_concurrent']
+        self.timeout = module.params['timeout']
+
+    def find_vms(self):
+        ''' returns a dict of vm name -> (vm, power state) for every vm on the datastores '''
+        vms = []
+        seen = set()
+        datastores = self.get_datastore_vms(self.datastore_names)
+        self.missing = [name for name in self.datastore_names if name not in datastores]
+        for name, datastore_vms in datastores.items():
+            for vm in datastore_vms:
+                # a vm with disks on several datastores is only torn down once
+                if vm._moId not in seen:
+                    seen.add(vm._moId)
+                    vms.append(vm)
+
+        found = dict()
+        for vm, props in get_properties(self.content, vim.VirtualMachine, ['name', 'runtime.powerState'], objs=vms):
+            # duplicate names can happen between UATs, so vms are keyed by name and moid
+            found['%s (%s)' % (props.get('name'), vm._moId)] = (vm, props.get('runtime.powerState'))
+        return found
+
+    def teardown(self):
+        start = time.time()
+        vms = self.find_vms()
+        for name in self.missing:
+            self.module.warn("Datastore %s not found, skipping it" % name)
+
+        results = dict()
+        for name, (vm, power_state) in vms.items():
+            results[name] = dict(powered_off=False, destroyed=False, power_state=power_state)
+
+        # power off everything that's running, all at once up to max_concurrent
+        jobs = []
+        for name, (vm, power_state) in vms.items():
+            if power_state == vim.VirtualMachinePowerState.poweredOn:
+                jobs.append((name, lambda vm=vm: vm.PowerOffVM_Task()))
+        for name, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent,
+                                           timeout=self.timeout).items():
+            results[name]['powered_off'] = task_result['success']
+            results[name]['seconds'] = task_result['seconds']
+            if not task_result['success']:
+                results[name]['msg'] = "Failed to power off: %s" % task_result['msg']
+
+        # then destroy every vm that is off, the same way
+        jobs = []
+        for name, (vm, power_state) in vms.items():
+            if 'msg' not in results[name]:
+                jobs.append((name, lambda vm=vm: vm.Destroy_Task()))
+        for name, task_result in run_tasks(self.content, jobs, max_concurrent=self.max_concurrent,
+                                           timeout=self.timeout).items():
+            results[name]['destroyed'] = task_result['success']
+            results[name]['seconds'] = round(results[name].get('seconds', 0) + task_result['seconds'], 2)
+            if not task_result['success']:
+                results[name]['msg'] = "Failed to destroy: %s" % task_result['msg']
+
+        result = dict(changed=any(vm['powered_off'] or vm['destroyed'] for vm in results.values()), vms=results,
+                      missing_datastores=self.missing, seconds=round(time.time() - start, 2))
+
+        failed = sorted(name for name in results if 'msg' in results[name])
+        if failed:
+            self.module.fail_json(msg="Failed to tear down %d of %d VMs: %s" %
+                                      (len(failed), len(results), ', '.join(failed)), **result)
+
+        self.module.exit_json(**result)
+
+
+def main():
+    argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        datastores=dict(type='list', elements='str', required=True),
+        max_concurrent=dict(type='int', default=8),
+        timeout=dict(type='int', default=3600),
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=False,
+    )
+
+    pyv = VMwareGuestTeardown(module)
+    pyv.teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,11 +10,12 @@ except ImportError:
     pass
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.vmware import PyVmomi, vmware_argument_spec
+from ansible.module_utils.vmware import vmware_argument_spec
+from ansible.module_utils.fl_vmware import SessionPyVmomi
 from ansible.module_utils._text import to_native
 
 
-class VmwareVcenterSettings(PyVmomi):
+class VmwareVcenterSettings(SessionPyVmomi):
     """Manage settings for a vCenter server"""
 
     def __init__(self, module):
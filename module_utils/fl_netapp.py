@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Kept-alive ZAPI connections for the forklift fl_na_ontap_* batch modules.
+#
+# NaServer builds a new urllib opener for every invoke, so every ZAPI call is
+# its own TCP and TLS handshake, and an unauthenticated request that ONTAP
+# answers with 401 before basic auth is sent. keep_alive() swaps that opener
+# for one that keeps a single HTTP/1.1 connection open and sends the
+# credentials up front. A connection can't be used by two threads at once, so
+# ServerPool gives every thread, e.g. each ThreadPool worker, its own NaServer
+# and connection. A batch then costs one handshake per worker.
+#
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import base64
+import io
+import socket
+import threading
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves import urllib
+import ansible.module_utils.netapp as netapp_utils
+
+
+class KeepAliveHandler(urllib.request.BaseHandler):
+    '''
+    urllib handler that sends every request over one kept-alive connection,
+    with a preemptive Authorization header. A connection the server closed
+    while it sat idle is reopened once.
+    '''
+
+    def __init__(self, authorization):
+        self.authorization = authorization
+        self.conn = None
+        self.used = False
+
+    def http_open(self, req):
+        return self.do_open(http_client.HTTPConnection, req)
+
+    def https_open(self, req):
+        # no context, so a validate_certs=false override of the default https
+        # context made by setup_na_ontap_zapi still applies
+        return self.do_open(http_client.HTTPSConnection, req)
+
+    def do_open(self, conn_class, req):
+        headers = dict(req.header_items())
+        headers['Connection'] = 'keep-alive'
+        headers['Authorization'] = self.authorization
+
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = conn_class(req.host, timeout=req.timeout)
+                self.used = False
+            reused = self.used
+            try:
+                self.conn.request(req.get_method(), req.selector, req.data, headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                break
+            except (http_client.HTTPException, socket.error) as error:
+                self.close()
+                # only a connection that already served a request may have
+                # been closed by the server in between, anything else is real
+                if attempt or not reused:
+                    raise urllib.error.URLError(error)
+
+        self.used = True
+        if resp.will_close:
+            self.close()
+
+        response = urllib.response.addinfourl(io.BytesIO(data), resp.msg, req.get_full_url(), resp.status)
+        response.msg = resp.reason
+        return response
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def keep_alive(server):
+    '''
+    Makes server, a NaServer, send its calls over a KeepAliveHandler and
+    returns the handler. Servers using certificate auth are left as they are,
+    None is returned for them.
+    '''
+    if server.get_style() != server.STYLE_LOGIN_PASSWORD:
+        return None
+
+    credentials = to_bytes('%s:%s' % (server._username, server._password))
+    handler = KeepAliveHandler('Basic %s' % to_text(base64.b64encode(credentials)))
+    opener = urllib.request.OpenerDirector()
+    for opener_handler in [handler, urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()]:
+        opener.add_handler(opener_handler)
+
+    # NaServer rebuilds its opener before every invoke unless _refresh_conn is off
+    server._opener = opener
+    server._refresh_conn = False
+    return handler
+
+
+class ServerPool(object):
+    '''
+    One kept-alive NaServer per thread, set up by setup_na_ontap_zapi for
+    module and vserver. get() returns the calling thread's server, so worker
+    threads never share a connection. close() closes every connection.
+    '''
+
+    def __init__(self, module, vserver=None):
+        self.module = module
+        self.vserver = vserver
+        self.local = threading.local()
+        self.handlers = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        server = getattr(self.local, 'server', None)
+        if server is None:
+            server = netapp_utils.setup_na_ontap_zapi(module=self.module, vserver=self.vserver)
+            handler = keep_alive(server)
+            if handler is not None:
+                with self.lock:
+                    self.handlers.append(handler)
+            self.local.server = server
+        return server
+
+    def close(self):
+        with self.lock:
+            for handler in self.handlers:
+                handler.close()
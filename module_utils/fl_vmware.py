@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+# Shared helpers for the forklift fl_vmware_* modules.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import datetime
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from pyVmomi import vim, vmodl, VmomiSupport
+except ImportError:
+    pass
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.vmware import PyVmomi, connect_to_api
+from ansible.module_utils import fl_vmware_session
+from ansible.module_utils.fl_vmware_index import InventoryIndex
+
+# objects returned per RetrievePropertiesEx/ContinueRetrievePropertiesEx page
+RETRIEVE_PAGE_SIZE = 500
+
+
+class SessionPyVmomi(PyVmomi):
+    '''
+    PyVmomi that attaches to the cached vCenter session of the user, see
+    module_utils/fl_vmware_session, and only logs in when there is none or it
+    has expired. Sets the same attributes as PyVmomi.__init__, which can't be
+    called as it always logs in.
+
+    The find_*_by_name methods, find_folder_by_name and find_by_inventory_path
+    look names up in the InventoryIndex kept with the session, instead of
+    walking the inventory.
+    '''
+    def __init__(self, module):
+        self.module = module
+        self.params = module.params
+        self.current_vm_obj = None
+
+        params = module.params
+        self.si, self.content, self.session_reused = fl_vmware_session.connect(
+            params['hostname'], params['port'], params['username'], params['password'],
+            # a cached session is left open for the next run, otherwise it's
+            # logged out at exit as usual
+            lambda: connect_to_api(module, disconnect_atexit=not fl_vmware_session.SESSION_CACHE, return_si=True),
+            context=fl_vmware_session.ssl_context(params['validate_certs']))
+
+        self.custom_field_mgr = []
+        if self.content.customFieldsManager:  # not an ESXi
+            self.custom_field_mgr = self.content.customFieldsManager.field
+
+        self._index = None
+
+    @property
+    def index(self):
+        ''' the InventoryIndex of this vCenter, loaded on first use '''
+        if self._index is None:
+            self._index = InventoryIndex(self.content, self.params['hostname'], self.params['port'],
+                                         self.params['username'], persist=fl_vmware_session.SESSION_CACHE)
+        return self._index
+
+    def find_datacenter_by_name(self, datacenter_name):
+        return self.index.find(vim.Datacenter, datacenter_name)
+
+    def find_cluster_by_name(self, cluster_name, datacenter_name=None):
+        # like PyVmomi's, datacenter_name is a datacenter object
+        return self.index.find(vim.ClusterComputeResource, cluster_name, datacenter=datacenter_name)
+
+    def find_hostsystem_by_name(self, host_name):
+        return self.index.find(vim.HostSystem, host_name)
+
+    def find_datastore_by_name(self, datastore_name):
+        return self.index.find(vim.Datastore, datastore_name)
+
+    def find_folder_by_name(self, folder_name):
+        return self.index.find(vim.Folder, folder_name)
+
+    def find_by_inventory_path(self, path):
+        ''' like searchIndex.FindByInventoryPath, for datacenters, clusters, hosts, datastores and folders '''
+        return self.index.find_by_inventory_path(path)
+
+    def get_datastore_vms(self, names):
+        '''
+        Returns a dict of datastore name -> list of the VMs on it, for the
+        datastores called one of names. The datastores are looked up in the
+        index, and only their vm lists are read, in one call.
+        '''
+        datastores = [ds for ds in (self.index.find(vim.Datastore, name) for name in set(names)) if ds is not None]
+        return dict((props['name'], props.get('vm') or [])
+                    for ds, props in get_properties(self.content, vim.Datastore, ['name', 'vm'], objs=datastores))
+
+
+def get_properties(content, vimtype, path_set, objs=None, container=None, recursive=True):
+    '''
+    Retrieves path_set properties of many managed objects with one paged
+    RetrievePropertiesEx call, instead of a round trip per property per object.
+
+    Pass either objs, a list of vimtype managed objects, or container, whose
+    vimtype descendants are read through a container view. With neither, all
+    vimtype objects under the root folder are read.
+
+    Returns a list of (managed object, {property path: value}) tuples. Unset
+    properties are left out of the dict.
+    '''
+    view = None
+    prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vimtype, pathSet=path_set)
+    if objs is not None:
+        if not objs:
+            return []
+        obj_specs = [vmodl.query.PropertyCollector.ObjectSpec(obj=obj, skip=False) for obj in objs]
+    else:
+        view = content.viewManager.CreateContainerView(container or content.rootFolder, [vimtype], recursive)
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(name='traverseEntities', path='view',
+                                                                     skip=False, type=vim.view.ContainerView)
+        obj_specs = [vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal_spec])]
+
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=obj_specs, propSet=[prop_spec])
+    options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=RETRIEVE_PAGE_SIZE)
+
+    collector = content.propertyCollector
+    objects = []
+    try:
+        result = collector.RetrievePropertiesEx(specSet=[filter_spec], options=options)
+        while result:
+            for obj_content in result.objects:
+                objects.append((obj_content.obj, dict((prop.name, prop.val) for prop in obj_content.propSet)))
+            if not result.token:
+                break
+            result = collector.ContinueRetrievePropertiesEx(token=result.token)
+    finally:
+        if view is not None:
+            view.Destroy()
+
+    return objects
+
+
+def serialize_property(value):
+    '''
+    Converts a property value read with get_properties() into something
+    exit_json can return. Managed objects become their moId, data objects a
+    dict of their set properties and datetimes an ISO 8601 string.
+    '''
+    if isinstance(value, VmomiSupport.ManagedObject):
+        return value._moId
+    if isinstance(value, VmomiSupport.DataObject):
+        out = dict()
+        for prop in value._GetPropertyList():
+            if prop.name in ['dynamicType', 'dynamicProperty']:
+                continue
+            prop_value = getattr(value, prop.name)
+            if prop_value is not None:
+                out[prop.name] = serialize_property(prop_value)
+        return out
+    if isinstance(value, list):
+        return [serialize_property(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class TaskTracker(object):
+    '''
+    Waits on many vSphere tasks at once. Every task added gets a filter on
+    one private PropertyCollector, and a single WaitForUpdatesEx call returns
+    state changes for all of them, instead of polling task.info per task.
+    '''
+
+    def __init__(self, content):
+        self.collector = content.propertyCollector.CreatePropertyCollector()
+        self.version = ''
+        self.tasks = {}
+
+    def add(self, key, task):
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=task, skip=False)
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vim.Task, pathSet=['info.state', 'info.error',
+                                                                                       'info.result'])
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=[prop_spec])
+        self.collector.CreateFilter(filter_spec, partialUpdates=False)
+        self.tasks[task._moId] = dict(key=key, started=time.time(), info={})
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def wait(self, timeout):
+        '''
+        Blocks until at least one task finishes or timeout seconds pass.
+        Returns a list of (key, result) tuples for the tasks that finished,
+        see task_result().
+        '''
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=max(int(timeout), 1))
+        update_set = self.collector.WaitForUpdatesEx(self.version, options)
+        if update_set is None:
+            return []
+        self.version = update_set.version
+
+        for filter_update in update_set.filterSet or []:
+            for object_update in filter_update.objectSet or []:
+                tracked = self.tasks.get(object_update.obj._moId)
+                if tracked is None:
+                    continue
+                for change in object_update.changeSet or []:
+                    tracked['info'][change.name] = change.val
+
+        finished = []
+        for moid, tracked in list(self.tasks.items()):
+            state = tracked['info'].get('info.state')
+            if state in [vim.TaskInfo.State.success, vim.TaskInfo.State.error]:
+                del self.tasks[moid]
+                finished.append((tracked['key'], task_result(tracked['started'], state, tracked['info'])))
+        return finished
+
+    def destroy(self):
+        # destroying the collector also destroys every filter created on it
+        try:
+            self.collector.DestroyPropertyCollector()
+        except Exception:
+            pass
+
+
+def task_result(started, state, info):
+    ''' builds the per task result dict returned by run_tasks() '''
+    result = dict(success=state == vim.TaskInfo.State.success, seconds=round(time.time() - started, 2))
+    if result['success']:
+        result['result'] = info.get('info.result')
+    else:
+        error = info.get('info.error')
+        result['msg'] = to_native(getattr(error, 'msg', None) or error or 'An unknown error has occurred')
+    return result
+
+
+def run_tasks(content, jobs, max_concurrent=8, timeout=3600):
+    '''
+    Runs vSphere tasks with bounded concurrency and waits on them together.
+
+    jobs is a list of (key, submit) tuples, where submit() starts a task and
+    returns it. At most max_concurrent tasks are in flight at a time, a new
+    one is submitted as soon as another finishes. A failed submit or task is
+    recorded and doesn't stop the others.
+
+    Returns a dict of key -> dict(success, seconds, result or msg).
+    '''
+    results = {}
+    pending = list(jobs)
+    pending.reverse()
+    tracker = TaskTracker(content)
+    deadline = time.time() + timeout
+
+    try:
+        while pending or len(tracker):
+            while pending and len(tracker) < max_concurrent:
+                key, submit = pending.pop()
+                started = time.time()
+                try:
+                    tracker.add(key, submit())
+                except vmodl.MethodFault as submit_error:
+                    results[key] = task_result(started, vim.TaskInfo.State.error, {'info.error': submit_error})
+
+            if not len(tracker):
+                continue
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            for key, result in tracker.wait(remaining):
+                results[key] = result
+    finally:
+        tracker.destroy()
+
+    # anything still in flight or never submitted ran out of time
+    for tracked in tracker.tasks.values():
+        results[tracked['key']] = dict(success=False, seconds=round(time.time() - tracked['started'], 2),
+                                       msg="Timed out after %d seconds waiting for task" % timeout)
+    for key, submit in pending:
+        results[key] = dict(success=False, seconds=0, msg="Timed out after %d seconds before task was started" % timeout)
+
+    return results
+
+
+def run_calls(jobs, max_concurrent=8, timeout=3600):
+    '''
+    Runs blocking vSphere calls, the ones that return a result rather than a
+    task (e.g. HostDatastoreSystem.CreateNasDatastore), on a bounded pool of
+    worker threads.
+
+    jobs is a list of (key, call) tuples, where call() makes the call. A
+    failed call is recorded and doesn't stop the others. A call still running
+    after timeout is reported as timed out and left to finish on its own.
+
+    Returns a dict of key -> dict(success, seconds, result or msg), like run_tasks().
+    '''
+    def run(call):
+        started = time.time()
+        try:
+            result = call()
+        except Exception as e:
+            return dict(success=False, seconds=round(time.time() - started, 2),
+                        msg=to_native(getattr(e, 'msg', None) or e))
+        return dict(success=True, seconds=round(time.time() - started, 2), result=result)
+
+    results = {}
+    if not jobs:
+        return results
+
+    started = time.time()
+    deadline = started + timeout
+    pool = ThreadPool(max(min(max_concurrent, len(jobs)), 1))
+    pending = [(key, pool.apply_async(run, (call,))) for key, call in jobs]
+    # worker threads are daemons, so a hung call doesn't keep the module from exiting
+    pool.close()
+
+    for key, async_result in pending:
+        async_result.wait(max(deadline - time.time(), 0))
+        if async_result.ready():
+            results[key] = async_result.get()
+        else:
+            results[key] = dict(success=False, seconds=round(time.time() - started, 2),
+                                msg="Timed out after %d seconds waiting for call" % timeout)
+
+    return results
+
+
+def wait_for_property(content, vimtype, objs, path, done, timeout=3600):
+    '''
+    Watches the path property of every vimtype object in objs, through one
+    private PropertyCollector and a single WaitForUpdatesEx loop, until
+    done(value) is true for all of them or timeout seconds pass.
+
+    Returns a dict of moId -> seconds until done(value) was first seen, or
+    None for the objects that timed out.
+    '''
+    start = time.time()
+    deadline = start + timeout
+    results = dict((obj._moId, None) for obj in objs)
+    if not objs:
+        return results
+
+    collector = content.propertyCollector.CreatePropertyCollector()
+    try:
+        obj_specs = [vmodl.query.PropertyCollector.ObjectSpec(obj=obj, skip=False) for obj in objs]
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vimtype, pathSet=[path])
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=obj_specs, propSet=[prop_spec])
+        collector.CreateFilter(filter_spec, partialUpdates=False)
+
+        version = ''
+        pending = len(results)
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=max(int(remaining), 1))
+            update_set = collector.WaitForUpdatesEx(version, options)
+            if update_set is None:
+                continue
+            version = update_set.version
+
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    moid = object_update.obj._moId
+                    if results.get(moid, 0) is not None:
+                        continue
+                    for change in object_update.changeSet or []:
+                        if change.name == path and done(change.val):
+                            results[moid] = round(time.time() - start, 2)
+                            pending -= 1
+                            break
+    finally:
+        try:
+            collector.DestroyPropertyCollector()
+        except Exception:
+            pass
+
+    return results
+
+
+def wait_for_tasks(content, tasks, timeout=3600):
+    '''
+    Waits on tasks that are already running. tasks is a dict of key -> task.
+    Returns a dict of key -> dict(success, seconds, result or msg), like
+    run_tasks().
+    '''
+    jobs = [(key, lambda task=task: task) for key, task in tasks.items()]
+    return run_tasks(content, jobs, max_concurrent=max(len(jobs), 1), timeout=timeout)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# Name to managed object index shared by the forklift fl_vmware_* modules.
+#
+# The find_*_by_name helpers and searchIndex.FindByInventoryPath walk a
+# container view of the whole inventory on every call, in every module run.
+# InventoryIndex reads the name and parent of every datacenter, cluster, host,
+# datastore and folder once, through a private PropertyCollector whose filter
+# is left in place on the cached vCenter session (see fl_vmware_session). The
+# index is kept on disk next to the session with the collector's data version,
+# so later runs only pull what changed since with a single WaitForUpdatesEx
+# call. It is rebuilt when the session changes or the collector is gone.
+#
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import fcntl
+import json
+import os
+
+try:
+    from pyVmomi import vim, vmodl, VmomiSupport
+except ImportError:
+    pass
+
+from ansible.module_utils import fl_vmware_session
+
+# objects returned per WaitForUpdatesEx call
+UPDATE_PAGE_SIZE = 500
+
+# bump whenever the layout of the index file changes, older indexes are discarded
+INDEX_VERSION = 1
+
+
+class InventoryIndex(object):
+    '''
+    Index of the datacenters, clusters, hosts, datastores and folders of a
+    vCenter by name and inventory path. With persist, it is kept for the
+    cached session of user at host, otherwise it's built for this run only.
+    '''
+
+    def __init__(self, content, host, port, user, persist=True):
+        self.content = content
+        self.stub = content.propertyCollector._stub
+        self.path = fl_vmware_session.session_file(host, port, user, 'index.json') if persist else None
+        self.objects = {}
+        self.names = {}
+
+        if self.path:
+            self._refresh()
+        else:
+            state = self._build()[1]
+            self._destroy(state)
+            self.objects = state['objects']
+        self._index_names()
+
+    def _build(self):
+        ''' returns a new private collector over the indexed types and its first state '''
+        collector = self.content.propertyCollector.CreatePropertyCollector()
+        # the container view is left in place, the filter depends on it. compute
+        # resources of standalone hosts are indexed too, hosts' paths go through them
+        view = self.content.viewManager.CreateContainerView(
+            self.content.rootFolder,
+            [vim.Datacenter, vim.ComputeResource, vim.HostSystem, vim.Datastore, vim.Folder], True)
+
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseEntities', path='view', skip=False, type=vim.view.ContainerView)
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal_spec])
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vim.ManagedEntity, pathSet=['name', 'parent'])
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=[prop_spec])
+        collector.CreateFilter(filter_spec, partialUpdates=False)
+
+        state = {'index_version': INDEX_VERSION,
+                 'session': self.stub.cookie,
+                 'collector': collector._moId,
+                 'view': view._moId,
+                 'version': '',
+                 'objects': {}}
+        self._update(collector, state)
+        return collector, state
+
+    def _update(self, collector, state):
+        ''' applies every change since state['version'] to state['objects'] and advances the version '''
+        # maxWaitSeconds=0 returns immediately instead of blocking for new changes
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=UPDATE_PAGE_SIZE)
+        while True:
+            update_set = collector.WaitForUpdatesEx(state['version'], options)
+            if update_set is None:
+                break
+
+            state['version'] = update_set.version
+            for filter_update in update_set.filterSet or []:
+                for update in filter_update.objectSet or []:
+                    key = update.obj._moId
+                    if update.kind == 'leave':
+                        state['objects'].pop(key, None)
+                        continue
+                    entry = state['objects'].setdefault(key, {'type': VmomiSupport.GetWsdlName(type(update.obj))})
+                    for change in update.changeSet or []:
+                        if change.op in ['remove', 'indirectRemove']:
+                            entry.pop(change.name, None)
+                        elif change.name == 'parent':
+                            entry['parent'] = change.val._moId if change.val is not None else None
+                        else:
+                            entry[change.name] = change.val
+
+            if not update_set.truncated:
+                break
+
+    def _refresh(self):
+        ''' loads the index kept on disk and brings it up to date, or rebuilds it '''
+        if not os.path.isdir(fl_vmware_session.SESSION_DIR):
+            os.makedirs(fl_vmware_session.SESSION_DIR, 0o700)
+
+        # one module at a time, the collector only keeps its latest version
+        with open('%s.lock' % self.path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            state = None
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+            except (IOError, OSError, ValueError):
+                pass
+
+            if state and state.get('index_version') == INDEX_VERSION and state.get('session') == self.stub.cookie:
+                try:
+                    self._update(vmodl.query.PropertyCollector(state['collector'], self.stub), state)
+                except Exception:
+                    # InvalidCollectorVersion or ManagedObjectNotFound, e.g. after a vCenter restart
+                    self._destroy(state)
+                    state = None
+            else:
+                state = None
+
+            if state is None:
+                state = self._build()[1]
+
+            tmp_path = '%s.%d' % (self.path, os.getpid())
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.rename(tmp_path, self.path)
+
+        self.objects = state['objects']
+
+    def _destroy(self, state):
+        ''' destroys the collector and view of a state on this session before it's rebuilt '''
+        try:
+            vmodl.query.PropertyCollector(state['collector'], self.stub).DestroyPropertyCollector()
+        except Exception:
+            pass
+        if state.get('view'):
+            try:
+                vim.view.ContainerView(state['view'], self.stub).Destroy()
+            except Exception:
+                pass
+
+    def _index_names(self):
+        for key, entry in self.objects.items():
+            self.names.setdefault((entry['type'], entry.get('name')), []).append(key)
+
+    def _mo(self, key):
+        return VmomiSupport.GetWsdlType('urn:vim25', self.objects[key]['type'])(key, self.stub)
+
+    def _datacenter(self, key):
+        ''' returns the moId of the datacenter key is in, or None '''
+        while key in self.objects:
+            if self.objects[key]['type'] == 'Datacenter':
+                return key
+            key = self.objects[key].get('parent')
+        return None
+
+    def find(self, vimtype, name, datacenter=None):
+        '''
+        Returns the first vimtype object called name, only in datacenter (an
+        object) when given, or None.
+        '''
+        for key in self.names.get((VmomiSupport.GetWsdlName(vimtype), name), []):
+            if datacenter is None or self._datacenter(key) == datacenter._moId:
+                return self._mo(key)
+        return None
+
+    def inventory_path(self, key):
+        ''' returns the inventory path of key, like FindByInventoryPath takes '''
+        names = []
+        while key in self.objects:
+            names.append(self.objects[key].get('name'))
+            key = self.objects[key].get('parent')
+        return '/'.join(reversed(names))
+
+    def find_by_inventory_path(self, path):
+        ''' returns the datacenter, cluster, host, datastore or folder at path, or None '''
+        path = path.strip('/')
+        name = path.rsplit('/', 1)[-1]
+        for (vimtype, key_name), keys in self.names.items():
+            if key_name != name:
+                continue
+            for key in keys:
+                if self.inventory_path(key) == path:
+                    return self._mo(key)
+        return None
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# vCenter session cache shared by the forklift fl_vmware_* modules and
+# inventory/vmware_folder_inventory.py.
+#
+# Every module run used to log in to vCenter and log out again at exit, so one
+# SAN build logged in hundreds of times. Instead, the cookie of the first
+# session is kept on disk, keyed by vCenter, port and user, and later runs
+# attach to it with a new stub. A salted PBKDF2 hash of the password is kept
+# with it, and a run with a different password logs in again rather than
+# reusing the session. A cached session is checked with one currentSession
+# read, and a fresh login replaces it once vCenter has expired it (idle
+# timeout, restart).
+#
+#   - FL_VMWARE_SESSION_DIR: where session files are kept
+#     (default ~/.ansible/tmp/fl_vmware_sessions). They hold a vCenter session
+#     cookie and are written with mode 0600.
+#   - FL_VMWARE_SESSION_CACHE: set to false to log in on every run.
+#
+# Only the standard library and pyVmomi are used, so the inventory script can
+# load this file by path.
+#
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import ssl
+import tempfile
+
+try:
+    from pyVmomi import vim, SoapStubAdapter
+except ImportError:
+    pass
+
+SESSION_DIR = os.path.expanduser(os.environ.get('FL_VMWARE_SESSION_DIR', '~/.ansible/tmp/fl_vmware_sessions'))
+SESSION_CACHE = os.environ.get('FL_VMWARE_SESSION_CACHE', 'true').lower() not in ['0', 'no', 'false']
+
+# PBKDF2 rounds of the password hash kept with a cached session
+PASSWORD_HASH_ROUNDS = 10000
+
+
+def ssl_context(validate_certs):
+    ''' returns the sslContext to connect with, None for the default verifying one '''
+    if not validate_certs and hasattr(ssl, '_create_unverified_context'):
+        return ssl._create_unverified_context()
+    return None
+
+
+def session_file(host, port, user, suffix='json'):
+    ''' returns the path of the file kept for the session of user at host, by suffix '''
+    key = hashlib.sha1(('%s:%s:%s' % (host, port, user)).encode('utf-8')).hexdigest()
+    return os.path.join(SESSION_DIR, '%s.%s' % (key, suffix))
+
+
+def password_hash(password, salt):
+    ''' returns the hex PBKDF2 hash of password with salt '''
+    return binascii.hexlify(hashlib.pbkdf2_hmac('sha256', (password or '').encode('utf-8'), salt.encode('utf-8'),
+                                                PASSWORD_HASH_ROUNDS)).decode('ascii')
+
+
+def load_session(host, port, user, password):
+    '''
+    returns the cached {'cookie', 'version'} for host, port and user, or None.
+    A session cached with another password is not returned.
+    '''
+    try:
+        with open(session_file(host, port, user)) as f:
+            session = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not session.get('cookie') or not session.get('version') or not session.get('salt'):
+        return None
+    if not hmac.compare_digest(session.get('password_hash', ''), password_hash(password, session['salt'])):
+        return None
+    return session
+
+
+def save_session(host, port, user, password, si):
+    ''' caches the cookie of service instance si, written atomically with mode 0600 '''
+    stub = si._stub
+    salt = binascii.hexlify(os.urandom(16)).decode('ascii')
+    session = {'cookie': stub.cookie, 'version': stub.version,
+               'salt': salt, 'password_hash': password_hash(password, salt)}
+    try:
+        if not os.path.isdir(SESSION_DIR):
+            os.makedirs(SESSION_DIR, 0o700)
+        fd, path = tempfile.mkstemp(dir=SESSION_DIR)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(session, f)
+        os.chmod(path, 0o600)
+        os.rename(path, session_file(host, port, user))
+    except (IOError, OSError):
+        # the cache is only an optimization, the next run logs in again
+        pass
+
+
+def forget_session(host, port, user):
+    try:
+        os.remove(session_file(host, port, user))
+    except OSError:
+        pass
+
+
+def attach_session(host, port, user, password, context=None):
+    '''
+    Returns (service instance, content) on the cached session of user at
+    host, or None when nothing is cached for password or vCenter no longer
+    knows the session.
+    '''
+    session = load_session(host, port, user, password)
+    if session is None:
+        return None
+
+    kwargs = {'host': host, 'port': int(port), 'version': session['version']}
+    if context:
+        kwargs['sslContext'] = context
+    try:
+        stub = SoapStubAdapter(**kwargs)
+        stub.cookie = session['cookie']
+        si = vim.ServiceInstance('ServiceInstance', stub)
+        content = si.RetrieveContent()
+        # an expired cookie reads as no current session rather than failing
+        if content.sessionManager.currentSession is not None:
+            return si, content
+    except Exception:
+        pass
+
+    forget_session(host, port, user)
+    return None
+
+
+def connect(host, port, user, password, login, context=None):
+    '''
+    Returns (service instance, content, reused). The cached session is used
+    when it's still valid and was cached with the same password, otherwise
+    login() is called for a new logged in (service instance, content), whose
+    session is cached for the next run. Cached sessions are never logged out,
+    vCenter expires them once idle.
+    '''
+    if SESSION_CACHE:
+        attached = attach_session(host, port, user, password, context=context)
+        if attached is not None:
+            return attached + (True,)
+
+    si, content = login()
+    if si is not None and SESSION_CACHE:
+        save_session(host, port, user, password, si)
+    return si, content, False
@@ -14,11 +14,13 @@ description:
     and used by the vmware_guest module to change a guests networks.
 requirements:
   - requests
-  - jmespath
   - vCenter >= 6.5
 options:
   _terms:
-    description: The name of the vmware guest to query.
+    description:
+    - The names of the vmware guests to query. All of them are resolved in
+      bulk, so looking up every guest of a play in one call (see examples)
+      takes a few requests in total rather than a few per guest.
     required: True
   network_map:
     description:
@@ -27,10 +29,31 @@ options:
       want to match and transform, and a 'dest' key - representing the network
       name you want to change the match to. If there is no 'src' match,
       the network name will be changed to 'quarentine'.
+    - A 'src' containing '*' or '?' is a wildcard pattern. Each '*' in its
+      'dest' is replaced by what the wildcards of 'src' matched, in order,
+      e.g. 'prod|*' -> 'uat1|*'.
+    - A 'src' starting with 're:' is a regular expression matched against the
+      whole network name. Its 'dest' may refer to groups, e.g. '\\1'.
+    - Exact names are matched first. Otherwise the first matching pattern,
+      in map order, wins.
+  max_workers:
+    description:
+    - Number of guests whose nics are read at a time.
+    default: 8
   provider:
     description:
     - A dict containing the vCenter credentials. Standard VMware env variables
       are used as fallback if this option is not used.
+notes:
+  - One REST session is kept per vCenter host and user, and shared by every
+    lookup in the process. Its id is also saved under
+    ~/.ansible/tmp/vmware_guest_networks (override with
+    VMWARE_REST_SESSION_DIR), so the worker processes ansible forks per task
+    reuse it instead of logging in again. An expired session is replaced on
+    the first 401.
+  - Guests and the network table are indexed for the life of the process.
+    vm hardware has no bulk REST call, so each guest's nics are still read
+    once, up to max_workers at a time.
 """
 
 EXAMPLES = """
@@ -72,6 +95,16 @@ EXAMPLES = """
     network_map:
       - src: "prod|app-dmz"
         dest: "dev|app-dmz"
+      # every other prod port group goes to its dev counterpart
+      - src: "prod|*"
+        dest: "dev|*"
+      - src: 're:^vlan(\\d+)-prod$'
+        dest: 'vlan\\1-dev'
+
+- name: resolve the networks of every guest in the play with one lookup
+  set_fact:
+    guest_networks: "{{ dict(ansible_play_hosts | zip(query('vmware_guest_networks', *ansible_play_hosts, network_map=network_map))) }}"
+  run_once: true
 """
 
 RETURN = """
@@ -86,9 +119,12 @@ obj_type:
         the default set of fields as per the object type
 """
 
+import hashlib
 import os
 import json
-import jmespath
+import re
+import threading
+from multiprocessing.pool import ThreadPool
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from ansible.errors import AnsibleError, AnsibleParserError
@@ -108,45 +144,307 @@ AUTH_ARG_SPEC = {
     },
 }
 
+SESSION_DIR = os.path.expanduser(os.getenv('VMWARE_REST_SESSION_DIR', '~/.ansible/tmp/vmware_guest_networks'))
+
+# vm names or network ids per filtered /rest/vcenter list call
+VM_FILTER_CHUNK = 100
+
+# REST sessions shared by every lookup in this process, keyed by (host, user),
+# and the guest network index of each session
+_sessions = {}
+_indexes = {}
+_sessions_lock = threading.Lock()
+
+
+class VCenterSession:
+    ''' a vCenter REST session, logged in once and reused until it expires '''
+
+    def __init__(self, host, user, password, validate_certs):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.lock = threading.Lock()
+
+        self.s = requests.Session()
+        if not validate_certs:
+            self.s.verify = False
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+        # start from the session a previous worker process saved, if any
+        self.sid = self._load_session_id()
+
+    def _session_file(self):
+        key = json.dumps([self.host, self.user])
+        return os.path.join(SESSION_DIR, 'session_%s' % hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _load_session_id(self):
+        try:
+            with open(self._session_file()) as f:
+                return f.read().strip() or None
+        except (IOError, OSError):
+            return None
+
+    def _save_session_id(self):
+        if not os.path.isdir(SESSION_DIR):
+            os.makedirs(SESSION_DIR, 0o700)
+
+        # write to a temp file and rename so concurrent workers never read a partial id
+        path = self._session_file()
+        tmp_path = '%s.%d.%d' % (path, os.getpid(), threading.current_thread().ident)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.sid)
+        os.rename(tmp_path, path)
+
+    def login(self, stale_sid=None):
+        ''' logs in, unless another thread or process already replaced stale_sid '''
+        with self.lock:
+            if self.sid != stale_sid:
+                return
+            saved_sid = self._load_session_id()
+            if saved_sid and saved_sid != stale_sid:
+                self.sid = saved_sid
+                return
+
+            resp = self.s.post('https://%s/rest/com/vmware/cis/session' % self.host, auth=(self.user, self.password))
+            if resp.status_code == 401:
+                raise AnsibleError("Unable to log on to vCenter at %s as %s: Unauthorized" % (self.host, self.user))
+            self.sid = resp.json()['value']
+            try:
+                self._save_session_id()
+            except (IOError, OSError) as e:
+                display.warning("Unable to save vCenter session for reuse: %s" % e)
+
+    def get(self, path, **kwargs):
+        ''' GET on the REST API, logging in again once if the session has expired '''
+        url = 'https://%s%s' % (self.host, path)
+        for attempt in range(2):
+            sid = self.sid
+            if sid is None:
+                self.login()
+                sid = self.sid
+            resp = self.s.get(url, headers={'vmware-api-session-id': sid}, **kwargs)
+            if resp.status_code != 401:
+                break
+            self.login(stale_sid=sid)
+        return resp
+
+
+def get_session(auth_params):
+    ''' returns the process wide session for auth_params' host and user '''
+    key = (auth_params['host'], auth_params['user'])
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = VCenterSession(auth_params['host'], auth_params['user'], auth_params['password'],
+                                            auth_params['validate_certs'])
+        return _sessions[key]
+
+
+class GuestNetworkIndex:
+    '''
+    vm name -> nics and network moid -> name, for one vCenter session. Filled
+    in bulk for every term of a lookup and kept for the rest of the process,
+    so later lookups of the same guests don't go back to vCenter.
+    '''
+
+    def __init__(self, session):
+        self.s = session
+        self.lock = threading.Lock()
+        # vm name -> moid
+        self.vms = {}
+        # vm moid -> list of (nic label, network moid)
+        self.nics = {}
+        # network moid -> name, None until the network table is read
+        self.networks = None
+
+    def get_json(self, path, **kwargs):
+        resp = self.s.get(path, **kwargs)
+        if resp.status_code != 200:
+            raise AnsibleError("Error: GET %s on vCenter %s failed with status %d: %s" %
+                               (path, self.s.host, resp.status_code, resp.text))
+        return json.loads(resp.text)['value']
+
+    def load_vms(self, names):
+        # names are listed VM_FILTER_CHUNK at a time, to keep urls well short
+        # of what vCenter accepts
+        for i in range(0, len(names), VM_FILTER_CHUNK):
+            params = {}
+            for n, name in enumerate(names[i:i + VM_FILTER_CHUNK]):
+                params['filter.names.%d' % (n + 1)] = name
+            for vm in self.get_json('/rest/vcenter/vm', params=params):
+                self.vms[vm['name']] = vm['vm']
+
+    def load_nics(self, moid):
+        ''' runs in a worker thread '''
+        vminfo = self.get_json('/rest/vcenter/vm/%s' % moid)
+        return [(nic['value']['label'], nic['value']['backing'].get('network')) for nic in vminfo['nics']]
+
+    def load_networks(self, network_ids):
+        '''
+        reads the network table once, then looks up whichever of network_ids
+        it doesn't hold by id. vCenter caps how many networks an unfiltered
+        list returns, and networks can be created since the table was read.
+        '''
+        if self.networks is None:
+            self.networks = dict((network['network'], network['name'])
+                                 for network in self.get_json('/rest/vcenter/network'))
+
+        missing = sorted(network_ids - set(self.networks))
+        for i in range(0, len(missing), VM_FILTER_CHUNK):
+            params = {}
+            for n, network in enumerate(missing[i:i + VM_FILTER_CHUNK]):
+                params['filter.networks.%d' % (n + 1)] = network
+            for network in self.get_json('/rest/vcenter/network', params=params):
+                self.networks[network['network']] = network['name']
+        # a network vCenter doesn't return is remembered as unnamed, so it
+        # isn't asked for again
+        for network in missing:
+            self.networks.setdefault(network, None)
+
+    def load(self, names, max_workers):
+        ''' makes sure every vm in names, and the networks they are on, are indexed '''
+        with self.lock:
+            missing = [name for name in names if name not in self.vms]
+            if missing:
+                self.load_vms(missing)
+
+            for name in names:
+                if name not in self.vms:
+                    raise AnsibleError("Error: Virtual Machine %s in vCenter %s not found" % (name, self.s.host))
+
+            # the REST api has no bulk call for vm hardware, so nics are read
+            # per vm, a few vms at a time
+            moids = sorted(set(self.vms[name] for name in names) - set(self.nics))
+            if moids:
+                pool = ThreadPool(max(min(max_workers, len(moids)), 1))
+                try:
+                    self.nics.update(zip(moids, pool.map(self.load_nics, moids)))
+                finally:
+                    pool.close()
+                    pool.join()
+
+            # the whole network table is read once. networks it doesn't hold
+            # are then looked up by id. nics without a backing network are left out.
+            network_ids = set(network for name in names for label, network in self.nics[self.vms[name]]
+                              if network is not None)
+            if self.networks is None or not network_ids.issubset(self.networks):
+                self.load_networks(network_ids)
+
+    def vm_networks(self, name):
+        ''' returns a list of (nic label, network name) for an indexed vm '''
+        return [(label, self.networks.get(network)) for label, network in self.nics[self.vms[name]]]
+
+
+def get_index(session):
+    ''' returns the process wide index for session '''
+    with _sessions_lock:
+        if session not in _indexes:
+            _indexes[session] = GuestNetworkIndex(session)
+        return _indexes[session]
+
+
+class NetworkMap:
+    '''
+    network_map compiled once per lookup: exact src names in a dict, and
+    wildcard and regex srcs as an ordered list of compiled rules. Names
+    already mapped are remembered, so each distinct network is only matched
+    against the rules once.
+    '''
+
+    def __init__(self, network_map):
+        self.exact = {}
+        self.rules = []
+        self.mapped = {}
+
+        for item in network_map:
+            src, dest = item['src'], item['dest']
+            if src.startswith('re:'):
+                try:
+                    self.rules.append((re.compile('(?:%s)$' % src[3:]), dest))
+                except re.error as e:
+                    raise AnsibleError("Error: invalid network_map regex '%s': %s" % (src[3:], e))
+            elif '*' in src or '?' in src:
+                self.rules.append(self.compile_wildcard(src, dest))
+            else:
+                # the first entry for a name wins, as it did when the map was scanned
+                self.exact.setdefault(src, dest)
+
+    @staticmethod
+    def compile_wildcard(src, dest):
+        ''' turns a wildcard src into a regex, and dest into its expand() template '''
+        pattern = ''
+        # numbers of the groups captured by a '*', the ones dest's '*'s refer to
+        star_groups = []
+        group = 0
+        for char in src:
+            if char == '*':
+                group += 1
+                star_groups.append(group)
+                pattern += '(.*)'
+            elif char == '?':
+                group += 1
+                pattern += '(.)'
+            else:
+                pattern += re.escape(char)
+
+        template = ''
+        stars = 0
+        for char in dest.replace('\\', '\\\\'):
+            if char == '*' and stars < len(star_groups):
+                template += '\\g<%d>' % star_groups[stars]
+                stars += 1
+            else:
+                template += char
+        return re.compile(pattern + '$'), template
+
+    def map(self, network_name):
+        ''' returns the dest network for network_name, or 'quarantine' if nothing matches '''
+        if network_name in self.exact:
+            return self.exact[network_name]
+        if network_name in self.mapped:
+            return self.mapped[network_name]
+
+        name = 'quarantine'
+        if network_name is not None:
+            for pattern, dest in self.rules:
+                match = pattern.match(network_name)
+                if match:
+                    name = match.expand(dest)
+                    break
+        self.mapped[network_name] = name
+        return name
+
+
 class GuestNetworksLookup:
 
     def run(self, terms, variables=None, **kwargs):
         ret = []
 
-        for term in terms:
-            display.debug("File lookup term: %s" % term)
+        self.provider = kwargs.pop('provider', {})
+        network_map = kwargs.pop('network_map', [])
+        if len(network_map) == 0:
+            raise AnsibleError("network map issue")
+        network_map = NetworkMap(network_map)
+        max_workers = kwargs.pop('max_workers', 8)
 
-            self.provider = kwargs.pop('provider', {})
-            network_map = kwargs.pop('network_map', [])
-            if len(network_map) == 0:
-                raise AnsibleError("network map issue")
+        # get the shared api session with vcenter
+        self.connect_to_api()
 
-            # create api session with vcenter
-            self.connect_to_api()
-            # get vm summary info
-            vminfo = self.get_vm_by_name(term)
-            # get squashed list of network oid's from returned vminfo
-            network_ids = jmespath.search("[*].value.backing.network", vminfo['value']['nics'])
-            # get json dictionary of all networks that vm is attached to
-            networks = self.get_networks_by_id(network_ids)
+        # resolve every term in bulk before building output
+        index = get_index(self.s)
+        index.load(list(terms), max_workers)
+
+        for term in terms:
+            display.debug("File lookup term: %s" % term)
 
             output = []
             # loop over each nic to build output
-            for nic in vminfo['value']['nics']:
-                moid = nic['value']['backing']['network']
-                # get network name when moid matches
-                network_name = jmespath.search("[?network=='%s'].name" % moid, networks['value'])[0]
+            for label, network_name in index.vm_networks(term):
                 # when name matches a 'src' in our network map, overwrite name
                 # with the value of the corresponding 'dest'. if no name matches
                 # then network name will be set to 'quarentine'
-                name = 'quarantine'
-                for item in network_map:
-                    if item['src'] == network_name:
-                        name = item['dest']
-                        break
-
-                info = { "label": nic['value']['label'],
-                         "name": name
+                info = { "label": label,
+                         "name": network_map.map(network_name)
                        }
                 output.append(info)
             ret.append(output)
@@ -170,46 +468,7 @@ class GuestNetworksLookup:
                     env_value = env_value.lower() not in ['0', 'false', 'no']
                 auth_params[arg] = env_value
 
-        self.s = requests.Session()
-        if not auth_params['validate_certs']:
-            self.s.verify = False
-            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-
-        resp = self.s.post('https://%s/rest/com/vmware/cis/session' % auth_params['host'],auth=(auth_params['user'],auth_params['password']))
-        if resp.status_code == 401:
-            raise AnsibleError("Unable to log on to vCenter at %s as %s: Unauthorized" % (auth_params['host'], auth_params['user']))
-
-        sid = resp.json()['value']
-        self.s.headers.update({'vmware-api-session-id': sid})
-
-    # Function to get all the VMs from vCenter inventory
-    def get_vm_by_name(self, name):
-        ''' returns the moid of a vm '''
-        # get vm moid from the vm summary
-        resp = self.s.get('https://%s/rest/vcenter/vm?filter.names=%s' % (self.provider['host'], name))
-        vm_summary = json.loads(resp.text)
-
-        if len(vm_summary['value']) == 0:
-            raise AnsibleError("Error: Virtual Machine %s in vCenter %s not found" % (name, self.provider['host']))
-
-        # get all vm details using the vm moid
-        # note: currently if someone is not authorized, vm_summary doesnt have a value list, throwing a key error
-        moid = vm_summary['value'][0]['vm']
-        resp = self.s.get('https://%s/rest/vcenter/vm/%s' % (self.provider['host'], moid))
-        return json.loads(resp.text)
-
-    def get_networks_by_id(self, network_ids):
-        # build our parameter filter spec of network id's
-        params = {}
-        for id in network_ids:
-            params['filter.networks.%s' % (network_ids.index(id)+1)] = id
-
-        resp = self.s.get('https://%s/rest/vcenter/network' % self.provider['host'], params=params)
-        return json.loads(resp.text)
-
-    def __del__(self):
-        if self.s.headers['vmware-api-session-id']:
-            self.s.delete('https://%s/rest/com/vmware/cis/session' % self.provider['host'])
+        self.s = get_session(auth_params)
 
 
 class LookupModule(LookupBase):